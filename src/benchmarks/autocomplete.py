@@ -0,0 +1,144 @@
+"""
+Compares the per-keystroke latency of guild autocompletion with a full fuzzywuzzy scan
+(the original autocompleter) and with GuildIndex, on synthetic guild names and typing.
+Then replays bursts of users typing at once, to count the searches AutocompleteCache saves.
+
+Run from src/ with: python -m benchmarks.autocomplete [guilds] [queries]
+"""
+import asyncio
+import random
+import string
+import sys
+import time
+from itertools import product
+
+from fuzzywuzzy import fuzz, process
+
+from bot.utils.search import AutocompleteCache, GuildIndex
+
+SYLLABLES = ['ka', 'ro', 'the', 'dark', 'em', 'pire', 'lu', 'na', 'fox', 'sky', 'blade', 'or', 'der', 'vo',
+             'id', 'wyn', 'ter', 'sun', 'iron', 'cat', 'mo', 'xi', 'ri', 'an', 'ex', 'tra', 'lo', 'gen']
+
+
+def synthetic_guilds(count: int, rng: random.Random) -> dict[str, str]:
+    g2p, tags = {}, set()
+    while len(g2p) < count:
+        words = [''.join(rng.choices(SYLLABLES, k=rng.randint(1, 3))).capitalize() for _ in range(rng.randint(1, 3))]
+        name = ' '.join(words)
+        tag = ''.join(rng.choices(string.ascii_letters, k=rng.randint(3, 4)))
+        if name not in g2p and tag not in tags:
+            g2p[name] = tag
+            tags.add(tag)
+    return g2p
+
+
+def keystrokes(g2p: dict[str, str], count: int, rng: random.Random) -> list[str]:
+    """Every prefix typed on the way to a guild's tag or name, sometimes with a typo"""
+    typed = []
+    for guild in rng.sample(list(g2p), count):
+        text = rng.choice([g2p[guild], g2p[guild].lower(), guild, guild.lower()])
+        if rng.random() < 0.2 and len(text) > 3:
+            i = rng.randrange(len(text))
+            text = text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+        typed.extend(text[:i] for i in range(1, len(text) + 1))
+    return typed
+
+
+def full_scan(g2p: dict[str, str], p2g: dict[str, str], value: str) -> list[str]:
+    def generate_letters(letter):
+        if len(letter) != 1 or not letter.isalpha():
+            raise ValueError
+        return [letter, letter.upper()] if letter.islower() else [letter, letter.lower()]
+
+    prefix_match = []
+    if len(value) <= 4:
+        try:
+            possible_words = map(''.join, product(*map(generate_letters, value)))
+        except ValueError:
+            pass
+        else:
+            prefix_match = list(filter(None, map(p2g.get, possible_words)))
+
+    results = process.extract(value, g2p.keys(), scorer=fuzz.partial_ratio, limit=25)
+    return [*prefix_match, *list(zip(*results))[0]]
+
+
+def percentiles(times: list[float]) -> str:
+    times = sorted(times)
+    p = lambda q: times[min(len(times) - 1, int(q * len(times)))] * 1000
+    return f"p50 {p(0.5):8.3f} ms, p99 {p(0.99):8.3f} ms, max {times[-1] * 1000:8.3f} ms"
+
+
+def measure(func, queries: list[str]) -> list[float]:
+    times = []
+    for q in queries:
+        t = time.perf_counter()
+        func(q)
+        times.append(time.perf_counter() - t)
+    return times
+
+
+async def burst(index: GuildIndex, typed: list[list[str]], cache: bool) -> tuple[int, float]:
+    """Users typing one keystroke each in turn, all at once; returns the searches run and the time taken"""
+    searches = 0
+
+    def search(query):
+        nonlocal searches
+        searches += 1
+        return index.search(query)
+
+    completions = AutocompleteCache()
+    t = time.perf_counter()
+    for i in range(max(map(len, typed))):
+        queries = [text[i] for text in typed if i < len(text)]
+        if cache:
+            await asyncio.gather(*(completions.get(q, index.version, search) for q in queries))
+        else:
+            for q in queries:
+                search(q)
+    return searches, time.perf_counter() - t
+
+
+def main():
+    guilds = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = random.Random(0)
+
+    g2p = synthetic_guilds(guilds, rng)
+    p2g = {v: k for k, v in g2p.items()}
+    queries = keystrokes(g2p, count, rng)
+    print(f"{guilds} guilds, {len(queries)} keystrokes")
+
+    index = GuildIndex()
+    t = time.perf_counter()
+    index.rebuild(g2p)
+    print(f"{'build':>10}: {(time.perf_counter() - t) * 1000:8.1f} ms")
+
+    # A refresh where a few guilds were created, deleted or changed tag
+    changed = dict(g2p)
+    for guild in rng.sample(list(g2p), guilds // 200):
+        del changed[guild]
+    changed.update(synthetic_guilds(guilds // 200, random.Random(1)))
+    t = time.perf_counter()
+    index.update(changed)
+    print(f"{'update':>10}: {(time.perf_counter() - t) * 1000:8.1f} ms for a 0.5% change")
+    index.rebuild(g2p)
+
+    # The full scan is slow, so it only types a sample of the keystrokes
+    print(f"{'full scan':>10}: {percentiles(measure(lambda q: full_scan(g2p, p2g, q), queries[::5]))}")
+    print(f"{'index':>10}: {percentiles(measure(index.search, queries))}")
+
+    # 200 users, typing mostly the names of the same popular guilds
+    popular = rng.sample(list(g2p), 20)
+    typed = []
+    for _ in range(200):
+        text = rng.choice(popular) if rng.random() < 0.8 else rng.choice(list(g2p))
+        typed.append([text[:i] for i in range(1, len(text) + 1)])
+    for cache in (False, True):
+        searches, elapsed = asyncio.run(burst(index, typed, cache))
+        print(f"{'cached' if cache else 'uncached':>10}: {searches:6} searches for "
+              f"{sum(map(len, typed))} keystrokes in {elapsed * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
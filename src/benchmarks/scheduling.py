@@ -0,0 +1,156 @@
+"""
+Replays guild histories against the guild update scheduling policies, and reports how many
+updates each one spends and how stale the stored guilds were in the meantime.
+
+A history is when each guild changed, and how many members changed each time, as JSON:
+{guild: [[timestamp, changes], ...]}. Histories can be read from such a file, recorded from
+the raw XP points in a local SQLite database (one point per past update, counting the
+members who gained XP), or generated.
+
+Run from src/ with: python -m benchmarks.scheduling [--histories FILE | --db FILE] [--guilds N] [--days D]
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import math
+import random
+import zlib
+from bisect import bisect_right
+from itertools import accumulate
+
+from bot.utils.scheduling import AdaptivePolicy, Observation, StepPolicy
+from bot.utils.timeseries import DAY
+
+
+def synthetic_histories(guilds: int, days: int, seed: int = 0) -> dict[str, list[tuple[float, int]]]:
+    """Guilds with heavy-tailed change rates, a tenth of which become much more active halfway through"""
+    rng = random.Random(seed)
+    histories = {}
+    for g in range(guilds):
+        rate = rng.lognormvariate(0, 1.5) / DAY
+        surge = rng.random() < 0.1
+        events, t = [], 0.0
+        while True:
+            current = rate * 5 if surge and t > days * DAY / 2 else rate
+            t += rng.expovariate(current)
+            if t >= days * DAY:
+                break
+            events.append((t, rng.randint(1, 3)))
+        histories[f'guild{g}'] = events
+    return histories
+
+
+def recorded_histories(filename: str) -> dict[str, list[tuple[float, int]]]:
+    from bot.database import SQLiteDatabase
+
+    async def read():
+        db = SQLiteDatabase(filename)
+        try:
+            return await db.child('wynncraft').child('xp').child('contributed').get() or {}
+        finally:
+            await db.close()
+
+    points = asyncio.run(read())
+    return {guild: sorted((int(ts), len(members)) for ts, members in updates.items())
+            for guild, updates in points.items()}
+
+
+class Guild:
+    __slots__ = ('times', 'counts', 'weighted', 'last', 'schedule')
+
+    def __init__(self, events: list[tuple[float, int]], start: float):
+        self.times = [t for t, _ in events]
+        # Prefix sums of changes, and of changes weighted by their time
+        self.counts = [0, *accumulate(c for _, c in events)]
+        self.weighted = [0, *accumulate(t * c for t, c in events)]
+        self.last = start
+        self.schedule = {}
+
+    def changes(self, start: float, end: float) -> tuple[int, float, float]:
+        """Changes in (start, end], how long they went unseen in total, and when the first one was"""
+        i, j = bisect_right(self.times, start), bisect_right(self.times, end)
+        count = self.counts[j] - self.counts[i]
+        unseen = count * end - (self.weighted[j] - self.weighted[i])
+        return count, unseen, self.times[i] if count else end
+
+
+def simulate(policy, histories: dict[str, list[tuple[float, int]]], days: int) -> dict:
+    start, end = 0.0, days * DAY
+    guilds = {name: Guild(events, start) for name, events in histories.items()}
+    policy.load({name: guild.schedule for name, guild in guilds.items()})
+
+    # Spread the first updates over a day, the same way for every policy
+    pq = [(zlib.crc32(name.encode()) % DAY, name) for name in guilds]
+    heapq.heapify(pq)
+
+    requests, unseen, stale = 0, 0.0, 0.0
+    while pq and pq[0][0] < end:
+        now, name = heapq.heappop(pq)
+        guild = guilds[name]
+        count, u, first = guild.changes(guild.last, now)
+        requests += 1
+        unseen += u
+        stale += now - first
+
+        interval = policy.next_interval(name, guild.schedule, Observation(now - guild.last, count, count))
+        guild.last = now
+        heapq.heappush(pq, (now + interval, name))
+
+    # Whatever changed since each guild's last update is still unseen at the end
+    for guild in guilds.values():
+        count, u, first = guild.changes(guild.last, end)
+        unseen += u
+        stale += end - first
+
+    guild_time = len(guilds) * (end - start)
+    return {
+        'requests': requests,
+        'per_day': requests / days,
+        # Average number of changes not yet picked up, per guild
+        'unseen': unseen / guild_time,
+        # Fraction of the time a guild's stored data was out of date
+        'stale': stale / guild_time
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--histories', help="JSON file of guild histories")
+    parser.add_argument('--db', help="SQLite database to record histories from")
+    parser.add_argument('--guilds', type=int, default=5000, help="number of synthetic guilds")
+    parser.add_argument('--days', type=int, default=60, help="days of history to replay")
+    args = parser.parse_args()
+
+    if args.histories:
+        with open(args.histories) as f:
+            histories = json.load(f)
+    elif args.db:
+        histories = recorded_histories(args.db)
+    else:
+        histories = synthetic_histories(args.guilds, args.days)
+
+    # Recorded histories are replayed from their first change
+    if args.histories or args.db:
+        first = min((events[0][0] for events in histories.values() if events), default=0)
+        histories = {g: [(t - first, c) for t, c in events] for g, events in histories.items()}
+        args.days = max(1, math.ceil(max((events[-1][0] for events in histories.values() if events),
+                                         default=DAY) / DAY))
+
+    changes = sum(c for events in histories.values() for _, c in events)
+    print(f"{len(histories)} guilds, {changes} changes over {args.days} days")
+
+    step = simulate(StepPolicy(), histories, args.days)
+    results = {'step': step}
+    # The adaptive policy with the same budget as the step policy spent, and with half of it
+    for fraction in (1, 0.5):
+        budget = step['per_day'] * fraction
+        results[f'adaptive {fraction:g}x'] = simulate(AdaptivePolicy(budget), histories, args.days)
+
+    print(f"{'policy':>14} {'requests':>10} {'per day':>9} {'unseen':>8} {'stale':>7}")
+    for name, r in results.items():
+        print(f"{name:>14} {r['requests']:>10} {r['per_day']:>9.0f} {r['unseen']:>8.3f} {r['stale']:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Compares building the online player snapshot the old way (reducing per-world dicts and
+concatenating the player lists) with PlayerSnapshot, on a synthetic onlinePlayers response.
+
+Run from src/ with: python -m benchmarks.snapshot [players] [worlds]
+"""
+import random
+import string
+import sys
+import time
+import tracemalloc
+from functools import reduce
+
+from bot.managers.players import PlayerSnapshot
+
+
+def synthetic_response(players: int, worlds: int) -> dict:
+    rng = random.Random(0)
+    names = {''.join(rng.choices(string.ascii_letters + string.digits + '_', k=rng.randint(3, 16)))
+             for _ in range(players)}
+    response = {f'WC{i + 1}': [] for i in range(worlds)}
+    for name in names:
+        response[f'WC{rng.randint(1, worlds)}'].append(name)
+    response['request'] = {'timestamp': int(time.time()), 'version': 1}
+    return response
+
+
+def old(response: dict):
+    players = dict(response)
+    del players['request']
+    worlds = reduce(lambda a, b: a | b, map(lambda i: {x: i[0] for x in i[1]}, players.items()))
+    return set(sum(players.values(), [])), worlds
+
+
+def new(response: dict):
+    return PlayerSnapshot.from_response(response)
+
+
+def measure(func, response: dict, repeat: int = 5) -> tuple[float, int]:
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        func(response)
+        best = min(best, time.perf_counter() - t)
+
+    tracemalloc.start()
+    result = func(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, peak
+
+
+def main():
+    players = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    worlds = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    response = synthetic_response(players, worlds)
+    print(f"{players} players on {worlds} worlds")
+
+    results = {name: measure(func, response) for name, func in (('old', old), ('snapshot', new))}
+    for name, (seconds, peak) in results.items():
+        print(f"{name:>10}: {seconds * 1000:8.2f} ms, peak {peak / 2 ** 20:7.2f} MiB")
+
+    (t_old, m_old), (t_new, m_new) = results.values()
+    print(f"{'speedup':>10}: {t_old / t_new:.1f}x time, {m_old / m_new:.1f}x peak memory")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+from .http import HTTPClient, HTTPResponse
+from .wynncraft import WynncraftAPI, WynncraftError
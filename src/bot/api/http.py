@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Mapping, NamedTuple, Optional
+
+import aiohttp
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data: bytes) -> Any:
+    if not data:
+        return None
+    return orjson.loads(data) if orjson else json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj) if orjson else json.dumps(obj, separators=(',', ':')).encode()
+
+
+class HTTPResponse(NamedTuple):
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+    def json(self) -> Any:
+        return loads(self.body)
+
+
+class HTTPClient:
+    """
+    One pooled aiohttp session shared by every outbound request for the lifetime of the bot.
+
+    Connections are kept alive and reused, with a cap per host so that one slow API can't
+    starve the others. Responses are decoded with orjson when it is installed.
+    """
+
+    def __init__(self, *, limit: int = 100, limit_per_host: int = 20, keepalive: float = 30,
+                 timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=30, connect=10),
+                 user_agent: str = 'EYESBot'):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.user_agent = user_agent
+
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # Created lazily so that it is bound to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                  headers={'User-Agent': self.user_agent})
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _send(self, method: str, url: str, raise_for_status: bool, **kwargs) -> HTTPResponse:
+        # Timeouts are raised as ServerTimeoutError, so callers only need to handle ClientError
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                if raise_for_status:
+                    response.raise_for_status()
+                return HTTPResponse(response.status, response.headers.copy(), await response.read())
+        except asyncio.TimeoutError as e:
+            if isinstance(e, aiohttp.ClientError):
+                raise
+            raise aiohttp.ServerTimeoutError(f"Timed out: {method} {url}") from e
+
+    async def fetch(self, method: str, url: str, *, params: dict = None, data: Any = None,
+                    headers: dict = None) -> HTTPResponse:
+        """Sends a request and returns the raw response whatever its status, for callers that handle it themselves"""
+        return await self._send(method, url, False, params=params, data=data, headers=headers)
+
+    async def request(self, method: str, url: str, *, params: dict = None, data: Any = None,
+                      headers: dict = None) -> Any:
+        """Sends a request and returns its decoded JSON body, raising ClientResponseError on an error status"""
+        response = await self._send(method, url, True, params=params, data=data, headers=headers)
+        return response.json()
+
+    async def get(self, url: str, **kwargs) -> Any:
+        return await self.request('GET', url, **kwargs)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import Any, Mapping, Optional, TypedDict
+
+from aiohttp import ClientConnectionError, ClientError
+
+from ..utils.cache import LRUCache
+from .http import HTTPClient
+
+LEGACY_URL = "https://api.wynncraft.com/public_api.php"
+
+
+class GuildMemberData(TypedDict):
+    name: str
+    uuid: str
+    rank: str
+    contributed: int
+    joined: str
+    joinedFriendly: str
+
+
+class GuildStats(TypedDict):
+    name: str
+    prefix: str
+    members: list[GuildMemberData]
+    xp: float
+    level: int
+    created: str
+    createdFriendly: str
+    territories: int
+
+
+class WynncraftError(ClientError):
+    """An error response from the Wynncraft API, either by status or by an 'error' in the body"""
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, in bursts of up to `capacity`.
+
+    The API's rate limit headers are authoritative: we never assume more tokens than it
+    says remain, and once it says none remain we wait until its window resets.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # The lock makes waiters take tokens in the order they asked for them
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe(self, headers: Mapping[str, str]):
+        """Adjusts the bucket to the RateLimit-Remaining/-Reset headers of a response, if it has them"""
+        try:
+            remaining = int(headers['RateLimit-Remaining'])
+            reset = float(headers.get('RateLimit-Reset', 0))
+        except (KeyError, ValueError):
+            return
+
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0 and reset > 0:
+            self.pause(reset)
+
+
+class WynncraftAPI:
+    """
+    A client for the Wynncraft API endpoints we use.
+
+    Every request, from any poller or command, takes a token from one shared bucket, so
+    they all spend the same rate limit budget. Rate limited, failed and timed out requests
+    are retried with exponential backoff and jitter. Responses carrying an ETag or
+    Last-Modified are revalidated with conditional requests, so unchanged data is neither
+    downloaded nor parsed again.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, http: HTTPClient, *, rate: float = 3, capacity: int = 10, retries: int = 3,
+                 backoff: float = 1, cache_size: int = 1024):
+        self.http = http
+        self.limiter = TokenBucket(rate, capacity)
+        self.retries = retries
+        self.backoff = backoff
+
+        # url and params -> (ETag, Last-Modified, decoded body)
+        self.validators = LRUCache(cache_size)
+
+        self.requests = 0
+        self.retried = 0
+        self.not_modified = 0
+
+    async def request(self, params: dict, url: str = LEGACY_URL) -> Any:
+        key = (url, tuple(sorted(params.items())))
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._request(url, params, key)
+            except (WynncraftError, ClientConnectionError) as e:
+                retry = isinstance(e, ClientConnectionError) or e.status in self.RETRY_STATUSES
+                if not retry or attempt == self.retries:
+                    raise
+
+            self.retried += 1
+            # Full jitter, so that requests that failed together don't retry together
+            await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    async def _request(self, url: str, params: dict, key: tuple) -> Any:
+        headers = {}
+        if cached := self.validators.peek(key):
+            etag, modified, _ = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if modified:
+                headers['If-Modified-Since'] = modified
+
+        await self.limiter.acquire()
+        self.requests += 1
+        response = await self.http.fetch('GET', url, params=params, headers=headers)
+        self.limiter.observe(response.headers)
+
+        if response.status == 304 and cached:
+            self.not_modified += 1
+            self.validators.get(key)
+            return cached[2]
+        if response.status == 429:
+            self.limiter.pause(float(response.headers.get('Retry-After') or self.backoff))
+        if response.status >= 400:
+            raise WynncraftError(f"{response.status} from {url} {params}", response.status)
+
+        data = response.json()
+        # The legacy API reports some errors (including its rate limit) in a successful response
+        if isinstance(data, dict) and 'error' in data:
+            status = 429 if 'limit' in str(data['error']).lower() else None
+            raise WynncraftError(str(data['error']), status)
+
+        etag, modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if etag or modified:
+            self.validators.set(key, (etag, modified, data))
+        return data
+
+    async def online_players(self) -> dict[str, list[str]]:
+        """World -> online players, along with the 'request' metadata"""
+        return await self.request({'action': 'onlinePlayers'})
+
+    async def guild_list(self) -> list[str]:
+        return (await self.request({'action': 'guildList'}))['guilds']
+
+    async def guild_stats(self, guild: str) -> Optional[GuildStats]:
+        """A guild's stats, or None if it doesn't exist (any more)"""
+        try:
+            return await self.request({'action': 'guildStats', 'command': guild})
+        except WynncraftError as e:
+            if str(e) == "Guild not found":
+                return None
+            raise
@@ -8,8 +8,10 @@ import pyrebase as pyrebase4
 from discord import Intents, Permissions
 from discord.ext import commands
 
+from .api import HTTPClient, WynncraftAPI
+from .database import FirebaseDatabase, SQLiteDatabase, WriteBuffer
 from .listeners import ReactionListener
-from .managers import ConfigManager, GuildPrefixManager, GuildMemberManager, PlayerManager
+from .managers import ConfigManager, GuildPrefixManager, GuildMemberManager, PlayerManager, PlaytimeManager, XPManager
 
 
 class SlashCommand:
@@ -33,12 +35,30 @@ class BotTask:
     def __init__(self, bot: EYESBot):
         self.bot = bot
 
+    async def close(self):
+        """Called on shutdown, before buffered writes are flushed"""
+        pass
+
+
+class _Bot(commands.Bot):
+    """A commands.Bot that lets EYESBot clean up its resources on shutdown"""
+    def __init__(self, eyes: EYESBot, **kwargs):
+        super().__init__(**kwargs)
+        self.eyes = eyes
+
+    async def close(self):
+        try:
+            await self.eyes.close()
+        finally:
+            await super().close()
+
 
 class EYESBot:
     def __init__(self, prefix: str):
-        self.bot = commands.Bot(command_prefix=prefix,
-                                intents=Intents.all(),
-                                auto_sync_commands=False)
+        self.bot = _Bot(self,
+                        command_prefix=prefix,
+                        intents=Intents.all(),
+                        auto_sync_commands=False)
         self.bot.remove_command('help')
 
         # Setup logging
@@ -52,20 +72,32 @@ class EYESBot:
         self.guilds = GuildMemberManager(self)
         self.prefixes = GuildPrefixManager(self)
         self.players = PlayerManager(self)
+        self.playtime = PlaytimeManager(self)
+        self.xp = XPManager(self)
         self.reaction = ReactionListener(self)
 
         self.tasks: dict[str, BotTask] = {}
+        self.started = False
 
-        # Using env variable as Heroku expects
-        firebase = pyrebase4.initialize_app(json.loads(os.getenv("DB_CREDS")))
-        self.db = firebase.database()
+        # Every outbound request shares this client's connection pool
+        self.http = HTTPClient()
+        self.wynn = WynncraftAPI(self.http)
+
+        # A local SQLite file can stand in for Firebase, e.g. for load testing
+        if db_path := os.getenv("DB_PATH"):
+            self.db = SQLiteDatabase(db_path)
+        else:
+            # Using env variable as Heroku expects
+            firebase = pyrebase4.initialize_app(json.loads(os.getenv("DB_CREDS")))
+            self.db = FirebaseDatabase.from_app(firebase, http=self.http)
+        self.writes = WriteBuffer(self.db, logger=self.logger)
 
         ConfigManager.init_db(self.db)
 
         self.bot.add_listener(self.on_ready)
 
     async def instantiate_commands(self):
-        guild_dict = self.db.child("application").child("commands").get().val()
+        guild_dict = await self.db.child('application').child('commands').get() or {}
 
         for sub_cls in SlashCommand.__subclasses__():
             name = sub_cls.name  # noqa : name is guaranteed to be defined
@@ -83,8 +115,14 @@ class EYESBot:
     async def on_ready(self):
         self.logger.info("Connected")
 
+        # on_ready fires again after every full reconnect, but polling and tasks must only start once
+        if self.started:
+            return
+        self.started = True
+
         self.players.run()
 
+        await ConfigManager.update()
         await self.instantiate_commands()
         await self.add_tasks()
 
@@ -92,5 +130,20 @@ class EYESBot:
 
         self.logger.info("Synced")
 
+    async def close(self):
+        for task in self.tasks.values():
+            try:
+                await task.close()
+            except Exception as e:
+                self.logger.error(f"Failed to close {type(task).__name__}: {e}")
+
+        try:
+            await self.writes.close()
+        except Exception as e:
+            self.logger.error(f"Failed to flush {len(self.writes)} buffered writes on shutdown: {e}")
+        finally:
+            await self.db.close()
+            await self.http.close()
+
     def run(self):
         self.bot.run(os.getenv("TOKEN"))
@@ -0,0 +1,5 @@
+from .backend import StorageBackend
+from .buffer import WriteBuffer
+from .firebase import FirebaseDatabase
+from .reference import Reference
+from .sqlite import SQLiteDatabase
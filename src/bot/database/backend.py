@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any
+
+from .reference import Reference
+
+
+class StorageBackend(ABC):
+    """
+    The interface every storage backend implements.
+
+    Data is a JSON tree, addressed by `/` separated paths relative to the root,
+    with the same semantics as the Firebase Realtime Database.
+    """
+
+    @property
+    def root(self) -> Reference:
+        return Reference(self)
+
+    def child(self, *keys) -> Reference:
+        return self.root.child(*keys)
+
+    @abstractmethod
+    async def get(self, path: str) -> Any:
+        """Reads the whole subtree at a path, or None if there is nothing there"""
+
+    @abstractmethod
+    async def shallow(self, path: str) -> list[str]:
+        """Returns only the keys directly under a path"""
+
+    @abstractmethod
+    async def order_by(self, path: str, child: str = '$key', *,
+                       start_at=None, end_at=None, equal_to=None,
+                       limit_to_first: int = None, limit_to_last: int = None) -> OrderedDict:
+        """Returns the children of a path ordered by `$key`, `$value` or a child path"""
+
+    @abstractmethod
+    async def set(self, path: str, data: Any) -> Any:
+        """Replaces the value at a path, None removes it"""
+
+    @abstractmethod
+    async def update(self, path: str, data: dict) -> Any:
+        """Updates multiple children at once, keys may be paths relative to `path`"""
+
+    @abstractmethod
+    async def push(self, path: str, data: Any) -> str:
+        """Adds a child with a generated key and returns that key"""
+
+    @abstractmethod
+    async def remove(self, path: str):
+        """Removes the value at a path"""
+
+    async def close(self):
+        pass
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import typing
+from typing import Any, Optional, Union
+
+if typing.TYPE_CHECKING:
+    from .backend import StorageBackend
+    from .reference import Reference
+
+
+class WriteBuffer:
+    """
+    A write-behind buffer that coalesces writes into a single multi-path update.
+
+    Writes are held for up to `interval` seconds (or until `max_size` paths are
+    pending) and then sent together. Later writes to the same path replace earlier
+    ones, and writes below a pending path are merged into it, so overlapping
+    writes never produce conflicting paths in the update. Increments are added to
+    whatever is pending at their path rather than replacing it.
+    """
+
+    def __init__(self, db: 'StorageBackend', *,
+                 interval: float = 10, max_size: int = 1000,
+                 logger: logging.Logger = None):
+        self.db = db
+        self.interval = interval
+        self.max_size = max_size
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._pending: dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+        # Statistics
+        self.writes = 0
+        self.flushed = 0
+        self.requests = 0
+        self._unflushed = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def saved(self) -> int:
+        """The number of round trips avoided by coalescing so far"""
+        return self.flushed - self.requests
+
+    @staticmethod
+    def _combine(old: Any, new: Any) -> Any:
+        """
+        The value that replaces a pending one. Two increments add up, and an increment on top
+        of any other pending value is applied to it right away, as the stored value is replaced.
+        """
+        try:
+            amount = new['.sv']['increment']
+        except (TypeError, KeyError):
+            return new
+        try:
+            return {'.sv': {'increment': old['.sv']['increment'] + amount}}
+        except (TypeError, KeyError):
+            pass
+        if isinstance(old, bool) or not isinstance(old, (int, float)):
+            old = 0
+        return old + amount
+
+    def _add(self, path: str, value: Any):
+        path = path.strip('/')
+
+        # Anything pending below this path is overwritten by it
+        prefix = path + '/'
+        for p in [p for p in self._pending if p.startswith(prefix)]:
+            del self._pending[p]
+
+        # If an ancestor is pending, we write into that value instead
+        parts = path.split('/')
+        for i in range(1, len(parts)):
+            ancestor = '/'.join(parts[:i])
+            if ancestor in self._pending:
+                self._pending[ancestor] = self._merge(self._pending[ancestor], parts[i:], value)
+                return
+
+        self._pending[path] = self._combine(self._pending[path], value) if path in self._pending else value
+
+    @classmethod
+    def _merge(cls, node: Any, parts: list[str], value: Any) -> Any:
+        # Copy on the way down so values passed in by callers are never mutated
+        node = dict(node) if isinstance(node, dict) else {}
+        key, rest = parts[0], parts[1:]
+
+        if rest:
+            node[key] = cls._merge(node.get(key), rest, value)
+        elif value is None:
+            node.pop(key, None)
+        else:
+            node[key] = cls._combine(node.get(key), value)
+
+        return node
+
+    async def _enqueue(self, items):
+        for path, value in items:
+            self._add(path, value)
+            self.writes += 1
+            self._unflushed += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        if len(self._pending) >= self.max_size:
+            await self.flush()
+
+    async def set(self, ref: Union['Reference', str], value: Any):
+        await self._enqueue([(str(ref), value)])
+
+    async def update(self, ref: Union['Reference', str], data: dict):
+        await self._enqueue((f"{ref}/{k}", v) for k, v in data.items())
+
+    async def remove(self, ref: Union['Reference', str]):
+        await self._enqueue([(str(ref), None)])
+
+    async def flush(self):
+        """Sends everything pending as one multi-path update"""
+        async with self._lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            count, self._unflushed = self._unflushed, 0
+            try:
+                await self.db.root.update(batch)
+            except Exception:
+                # Put the batch back underneath anything written since
+                newer, self._pending = self._pending, {}
+                for path, value in (*batch.items(), *newer.items()):
+                    self._add(path, value)
+                self._unflushed += count
+                raise
+
+            self.flushed += count
+            self.requests += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                self.logger.error(f"Failed to flush {len(self)} buffered writes: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        await self.flush()
+        self.logger.info(f"Write buffer: {self.writes} writes in {self.requests} requests "
+                         f"({self.saved} round trips saved)")
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from urllib.parse import quote
+
+from ..api.http import HTTPClient, dumps
+from .backend import StorageBackend
+
+
+class FirebaseDatabase(StorageBackend):
+    """
+    An async gateway to the Firebase Realtime Database REST API.
+
+    Unlike pyrebase, every call is awaitable and goes through the bot's pooled
+    HTTP client, so requests never block the event loop and can be
+    sent concurrently with `asyncio.gather`.
+    """
+
+    def __init__(self, database_url: str, credentials=None, *, http: HTTPClient = None):
+        self.database_url = database_url.rstrip('/')
+        self.credentials = credentials
+
+        # Only a client we created ourselves is ours to close
+        self._owns_http = http is None
+        self.http = http or HTTPClient()
+        self._token: Optional[str] = None
+        self._token_expiry = 0.0
+        self._token_lock = asyncio.Lock()
+
+    @classmethod
+    def from_app(cls, firebase, **kwargs) -> FirebaseDatabase:
+        """Creates a gateway from an initialised pyrebase app, reusing its credentials"""
+        return cls(firebase.database_url, firebase.credentials, **kwargs)
+
+    async def close(self):
+        if self._owns_http:
+            await self.http.close()
+
+    async def _headers(self) -> dict:
+        if self.credentials is None:
+            return {}
+
+        async with self._token_lock:
+            # Refresh a minute early so that in-flight requests don't race expiry
+            if self._token is None or time.time() > self._token_expiry - 60:
+                # oauth2client is blocking, so we refresh in an executor
+                loop = asyncio.get_running_loop()
+                info = await loop.run_in_executor(None, self.credentials.get_access_token)
+                self._token = info.access_token
+                self._token_expiry = time.time() + (info.expires_in or 3600)
+
+        return {'Authorization': f"Bearer {self._token}"}
+
+    def url(self, path: str) -> str:
+        path = quote(path.strip('/'))
+        return f"{self.database_url}/{path}.json"
+
+    async def request(self, method: str, path: str, data: Any = None, params: dict = None) -> Any:
+        # Firebase expects query parameters to be JSON encoded
+        params = {k: json.dumps(v) for k, v in (params or {}).items() if v is not None}
+        body = dumps(data) if method != 'GET' and method != 'DELETE' else None
+
+        return await self.http.request(method, self.url(path), data=body, params=params,
+                                       headers=await self._headers())
+
+    async def get(self, path: str, **params) -> Any:
+        return await self.request('GET', path, params=params)
+
+    async def shallow(self, path: str) -> list[str]:
+        result = await self.request('GET', path, params={'shallow': True})
+        return list(result) if isinstance(result, dict) else []
+
+    async def order_by(self, path: str, child: str = '$key', *,
+                       start_at=None, end_at=None, equal_to=None,
+                       limit_to_first: int = None, limit_to_last: int = None) -> OrderedDict:
+        # The REST API returns an unordered object, so we sort it ourselves
+        result = await self.request('GET', path, params={
+            'orderBy': child, 'startAt': start_at, 'endAt': end_at, 'equalTo': equal_to,
+            'limitToFirst': limit_to_first, 'limitToLast': limit_to_last
+        })
+
+        if not isinstance(result, dict):
+            return OrderedDict()
+
+        if child == '$key':
+            items = sorted(result.items(), key=lambda i: i[0])
+        elif child == '$value':
+            items = sorted(result.items(), key=lambda i: i[1])
+        else:
+            items = sorted(result.items(), key=lambda i: (child in i[1], i[1].get(child, '')))
+
+        return OrderedDict(items)
+
+    async def set(self, path: str, data: Any) -> Any:
+        return await self.request('PUT', path, data)
+
+    async def update(self, path: str, data: dict) -> Any:
+        return await self.request('PATCH', path, data)
+
+    async def push(self, path: str, data: Any) -> str:
+        return (await self.request('POST', path, data))['name']
+
+    async def remove(self, path: str):
+        await self.request('DELETE', path)
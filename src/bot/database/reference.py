@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import typing
+from typing import Any
+
+if typing.TYPE_CHECKING:
+    from .backend import StorageBackend
+
+
+class Reference:
+    """
+    An immutable pointer to a location in the database, along with any query parameters.
+
+    Every builder method returns a new Reference instead of mutating this one,
+    so references can be stored, shared between tasks and used concurrently.
+    """
+    __slots__ = ('_db', '_path', '_query')
+
+    def __init__(self, db: 'StorageBackend', path: tuple[str, ...] = (), query: tuple = ()):
+        object.__setattr__(self, '_db', db)
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_query', query)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Reference is immutable")
+
+    def __repr__(self):
+        return f"<Reference path={self.path!r}>"
+
+    def __str__(self):
+        return self.path
+
+    def __eq__(self, other):
+        if not isinstance(other, Reference):
+            return NotImplemented
+        return self._db is other._db and self._path == other._path and self._query == other._query
+
+    def __hash__(self):
+        return hash((self._path, self._query))
+
+    @property
+    def path(self) -> str:
+        return '/'.join(self._path)
+
+    @property
+    def key(self) -> str | None:
+        return self._path[-1] if self._path else None
+
+    @property
+    def parent(self) -> Reference:
+        return Reference(self._db, self._path[:-1])
+
+    @property
+    def query(self) -> dict:
+        return dict(self._query)
+
+    def child(self, *keys) -> Reference:
+        """Returns a reference to a descendant, keys may themselves contain `/`"""
+        parts = tuple(p for k in keys for p in str(k).split('/') if p)
+        return Reference(self._db, self._path + parts)
+
+    def _with(self, **params) -> Reference:
+        query = dict(self._query)
+        query.update(params)
+        return Reference(self._db, self._path, tuple(query.items()))
+
+    def order_by_key(self) -> Reference:
+        return self._with(orderBy='$key')
+
+    def order_by_value(self) -> Reference:
+        return self._with(orderBy='$value')
+
+    def order_by_child(self, child: str) -> Reference:
+        return self._with(orderBy=child)
+
+    def start_at(self, value) -> Reference:
+        return self._with(startAt=value)
+
+    def end_at(self, value) -> Reference:
+        return self._with(endAt=value)
+
+    def equal_to(self, value) -> Reference:
+        return self._with(equalTo=value)
+
+    def limit_to_first(self, limit: int) -> Reference:
+        return self._with(limitToFirst=limit)
+
+    def limit_to_last(self, limit: int) -> Reference:
+        return self._with(limitToLast=limit)
+
+    async def get(self) -> Any:
+        """Reads the value here, ordered queries always return an OrderedDict"""
+        query = self.query
+        if 'orderBy' not in query:
+            return await self._db.get(self.path)
+
+        return await self._db.order_by(self.path, query.pop('orderBy'),
+                                       start_at=query.get('startAt'),
+                                       end_at=query.get('endAt'),
+                                       equal_to=query.get('equalTo'),
+                                       limit_to_first=query.get('limitToFirst'),
+                                       limit_to_last=query.get('limitToLast'))
+
+    async def shallow(self) -> list[str]:
+        return await self._db.shallow(self.path)
+
+    async def set(self, data: Any) -> Any:
+        return await self._db.set(self.path, data)
+
+    async def update(self, data: dict) -> Any:
+        return await self._db.update(self.path, data)
+
+    async def push(self, data: Any) -> Reference:
+        """Adds a child with a generated key and returns a reference to it"""
+        return self.child(await self._db.push(self.path, data))
+
+    async def remove(self):
+        await self._db.remove(self.path)
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator, Optional
+
+from .backend import StorageBackend
+
+# Keys that Firebase treats as 32-bit integers, which sort numerically before all other keys
+INT_KEY = re.compile(r'^(0|-?[1-9][0-9]*)$')
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    key TEXT NOT NULL,
+    ikey INTEGER,
+    value TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS nodes_children ON nodes (parent, ikey, key);
+"""
+
+
+def int_key(key: str) -> Optional[int]:
+    if INT_KEY.match(key) and INT_MIN <= (i := int(key)) <= INT_MAX:
+        return i
+    return None
+
+
+def split(path: str) -> tuple[str, str]:
+    parent, _, key = path.rpartition('/')
+    return parent, key
+
+
+def join(*parts: str) -> str:
+    return '/'.join(p.strip('/') for p in parts if p.strip('/'))
+
+
+def value_rank(value: Any) -> tuple:
+    """Sort key matching Firebase's ordering of values: null, false, true, numbers, strings, objects"""
+    if value is None:
+        return 0,
+    if isinstance(value, bool):
+        return 1, value
+    if isinstance(value, (int, float)):
+        return 2, value
+    if isinstance(value, str):
+        return 3, value
+    return 4,
+
+
+class SQLiteDatabase(StorageBackend):
+    """
+    A storage backend that keeps the JSON tree in a local SQLite database.
+
+    Every node (including objects) is a row keyed by its full path, with an index
+    on (parent, key) so that shallow reads and key range queries only touch the
+    children involved. SQLite calls run on a dedicated thread to keep the event
+    loop free, and the database runs in WAL mode so readers never block writers.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self._last_push_time = 0
+        self._last_push_rand: list[int] = []
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.filename, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    async def _run(self, func, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        await self._run(_close)
+        self._executor.shutdown(wait=False)
+
+    # Reading
+
+    def _read(self, path: str) -> Any:
+        path = path.strip('/')
+        if path:
+            row = self.conn.execute("SELECT value FROM nodes WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return None
+            if row[0] is not None:
+                return json.loads(row[0])
+
+            # '/' + 1 == '0', so this range is exactly the subtree below path
+            rows = self.conn.execute("SELECT path, value FROM nodes WHERE path > ? AND path < ? "
+                                     "AND value IS NOT NULL", (path + '/', path + '0'))
+            start = len(path) + 1
+        else:
+            rows = self.conn.execute("SELECT path, value FROM nodes WHERE value IS NOT NULL")
+            start = 0
+
+        tree = {}
+        for leaf, value in rows:
+            node = tree
+            *parents, key = leaf[start:].split('/')
+            for p in parents:
+                node = node.setdefault(p, {})
+            node[key] = json.loads(value)
+
+        return tree or None
+
+    def _shallow(self, path: str) -> list[str]:
+        return [k for k, in self.conn.execute("SELECT key FROM nodes WHERE parent = ?", (path.strip('/'),))]
+
+    def _children_by_key(self, path, start_at, end_at, equal_to, limit_to_first, limit_to_last):
+        where, args = ["parent = ?"], [path]
+
+        if equal_to is not None:
+            where.append("key = ?")
+            args.append(str(equal_to))
+        if start_at is not None:
+            if (i := int_key(str(start_at))) is not None:
+                where.append("(ikey IS NULL OR ikey >= ?)")
+                args.append(i)
+            else:
+                where.append("(ikey IS NULL AND key >= ?)")
+                args.append(str(start_at))
+        if end_at is not None:
+            if (i := int_key(str(end_at))) is not None:
+                where.append("ikey <= ?")
+                args.append(i)
+            else:
+                where.append("(ikey IS NOT NULL OR key <= ?)")
+                args.append(str(end_at))
+
+        order = "ikey IS NULL, ikey, key"
+        if limit_to_last is not None:
+            order = "ikey IS NULL DESC, ikey DESC, key DESC"
+
+        sql = f"SELECT path, key, value FROM nodes WHERE {' AND '.join(where)} ORDER BY {order}"
+        if limit := limit_to_first if limit_to_first is not None else limit_to_last:
+            sql += f" LIMIT {int(limit)}"
+
+        rows = self.conn.execute(sql, args).fetchall()
+        return rows[::-1] if limit_to_last is not None else rows
+
+    def _children_by_value(self, path, child, start_at, end_at, equal_to, limit_to_first, limit_to_last):
+        if child == '$value':
+            rows = self.conn.execute("SELECT path, key, ikey, value, value FROM nodes WHERE parent = ?", (path,))
+        else:
+            # An object child has no value of its own, so we mark it as one
+            rows = self.conn.execute("SELECT n.path, n.key, n.ikey, n.value, "
+                                     "CASE WHEN c.path IS NOT NULL AND c.value IS NULL THEN '{}' ELSE c.value END "
+                                     "FROM nodes n LEFT JOIN nodes c ON c.path = n.path || '/' || ? "
+                                     "WHERE n.parent = ?", (child.strip('/'), path))
+
+        def sort_key(row):
+            _, key, ikey, _, value = row
+            value = json.loads(value) if value is not None else None
+            return value_rank(value), (ikey is None, ikey or 0, key)
+
+        rows = sorted(rows, key=sort_key)
+
+        if equal_to is not None:
+            rows = [r for r in rows if sort_key(r)[0] == value_rank(equal_to)]
+        if start_at is not None:
+            rows = [r for r in rows if sort_key(r)[0] >= value_rank(start_at)]
+        if end_at is not None:
+            rows = [r for r in rows if sort_key(r)[0] <= value_rank(end_at)]
+
+        if limit_to_first is not None:
+            rows = rows[:limit_to_first]
+        elif limit_to_last is not None:
+            rows = rows[-limit_to_last:] if limit_to_last else []
+
+        return [(p, k, v) for p, k, _, v, _ in rows]
+
+    def _order_by(self, path, child, **query) -> OrderedDict:
+        path = path.strip('/')
+        if child == '$key':
+            rows = self._children_by_key(path, **query)
+        else:
+            rows = self._children_by_value(path, child, **query)
+
+        # Leaves already have their values, objects need their subtree read
+        return OrderedDict((k, json.loads(v) if v is not None else self._read(p)) for p, k, v in rows)
+
+    # Writing
+
+    @staticmethod
+    def _flatten(path: str, value: Any) -> Iterator[tuple[str, Optional[str]]]:
+        if isinstance(value, list):
+            value = {str(i): v for i, v in enumerate(value)}
+
+        if isinstance(value, dict):
+            children = [(join(path, str(k)), v) for k, v in value.items() if v is not None]
+            rows = [row for c in children for row in SQLiteDatabase._flatten(*c)]
+            # Empty objects don't exist in the tree
+            if rows:
+                yield path, None
+                yield from rows
+        elif value is not None:
+            yield path, json.dumps(value)
+
+    def _delete(self, path: str):
+        self.conn.execute("DELETE FROM nodes WHERE path = ? OR (path > ? AND path < ?)",
+                          (path, path + '/', path + '0'))
+
+    def _prune(self, path: str):
+        """Removes ancestors of a path that no longer have any children"""
+        while path:
+            path, _ = split(path)
+            if not path or self.conn.execute("SELECT 1 FROM nodes WHERE parent = ? LIMIT 1", (path,)).fetchone():
+                return
+            self.conn.execute("DELETE FROM nodes WHERE path = ?", (path,))
+
+    def _resolve(self, path: str, value: Any) -> Any:
+        """Resolves Firebase server values anywhere in a value, against what is stored before it's written"""
+        if isinstance(value, list):
+            value = {str(i): v for i, v in enumerate(value)}
+        if not isinstance(value, dict):
+            return value
+        if '.sv' not in value:
+            return {k: self._resolve(join(path, str(k)), v) for k, v in value.items()}
+
+        server_value = value['.sv']
+        if server_value == 'timestamp':
+            return int(time.time() * 1000)
+        if isinstance(server_value, dict) and 'increment' in server_value:
+            current = self._read(path)
+            if not isinstance(current, (int, float)) or isinstance(current, bool):
+                current = 0
+            return current + server_value['increment']
+
+        raise ValueError(f"Unsupported server value: {server_value}")
+
+    def _write(self, path: str, value: Any):
+        path = path.strip('/')
+        value = self._resolve(path, value)
+        if not path:
+            self.conn.execute("DELETE FROM nodes")
+        else:
+            self._delete(path)
+
+        rows = [(p, *split(p), int_key(split(p)[1]), v) for p, v in self._flatten(path, value) if p]
+        if not rows:
+            self._prune(path)
+            return
+
+        self.conn.executemany("INSERT INTO nodes (path, parent, key, ikey, value) VALUES (?, ?, ?, ?, ?)", rows)
+
+        # Make sure every ancestor exists as an object, replacing any leaf in the way
+        ancestor, _ = split(path)
+        while ancestor:
+            parent, key = split(ancestor)
+            self.conn.execute("INSERT INTO nodes (path, parent, key, ikey, value) VALUES (?, ?, ?, ?, NULL) "
+                              "ON CONFLICT (path) DO UPDATE SET value = NULL",
+                              (ancestor, parent, key, int_key(key)))
+            ancestor = parent
+
+    def _transaction(self, writes: list[tuple[str, Any]]):
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for path, value in writes:
+                self._write(path, value)
+
+    def _push_id(self) -> str:
+        """Generates a chronologically ordered key in the same format as Firebase"""
+        now = int(time.time() * 1000)
+        duplicate = now == self._last_push_time
+        self._last_push_time = now
+
+        ts = []
+        for _ in range(8):
+            ts.append(PUSH_CHARS[now % 64])
+            now //= 64
+
+        if not duplicate:
+            self._last_push_rand = [random.randrange(64) for _ in range(12)]
+        else:
+            # Same millisecond, so we increment the random part to keep ordering
+            i = 11
+            while i >= 0 and self._last_push_rand[i] == 63:
+                self._last_push_rand[i] = 0
+                i -= 1
+            self._last_push_rand[i] += 1
+
+        return ''.join(reversed(ts)) + ''.join(PUSH_CHARS[i] for i in self._last_push_rand)
+
+    # StorageBackend
+
+    async def get(self, path: str) -> Any:
+        return await self._run(self._read, path)
+
+    async def shallow(self, path: str) -> list[str]:
+        return await self._run(self._shallow, path)
+
+    async def order_by(self, path: str, child: str = '$key', *,
+                       start_at=None, end_at=None, equal_to=None,
+                       limit_to_first: int = None, limit_to_last: int = None) -> OrderedDict:
+        return await self._run(lambda: self._order_by(path, child,
+                                                      start_at=start_at, end_at=end_at, equal_to=equal_to,
+                                                      limit_to_first=limit_to_first, limit_to_last=limit_to_last))
+
+    async def set(self, path: str, data: Any) -> Any:
+        await self._run(self._transaction, [(path, data)])
+        return data
+
+    async def update(self, path: str, data: dict) -> Any:
+        await self._run(self._transaction, [(join(path, k), v) for k, v in data.items()])
+        return data
+
+    async def push(self, path: str, data: Any) -> str:
+        def _push():
+            key = self._push_id()
+            self._transaction([(join(path, key), data)])
+            return key
+
+        return await self._run(_push)
+
+    async def remove(self, path: str):
+        await self._run(self._transaction, [(path, None)])
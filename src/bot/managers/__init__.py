@@ -1,3 +1,5 @@
 from .config import ConfigManager
 from .guilds import GuildPrefixManager, GuildMemberManager
 from .players import PlayerManager
+from .playtime import PlaytimeManager
+from .xp import XPManager
@@ -6,21 +6,20 @@ class ConfigManager:
     @classmethod
     def init_db(cls, db):
         cls._db = db
-        cls.update()
 
     @classmethod
-    def update(cls):
+    async def update(cls):
         if not cls._db:
             raise ValueError("db has not been initialised")
 
-        data = cls._db.child('config').get().val()
+        data = await cls._db.child('config').get() or {}
         cls._global = data.get('global', {})
         cls._guild = data.get('guild', {})
 
         print(cls._global)
 
     @classmethod
-    def get(cls, path, key, guild_id=None, user_id=None):
+    async def get(cls, path, key, guild_id=None, user_id=None):
         print(cls._global)
         # TODO: Implement paths of depth >1 (containing /)
         if not cls._db:
@@ -36,7 +35,7 @@ class ConfigManager:
 
         # Finally we try users
         if user_id is not None:
-            user_dict = cls._db.child("config").child("user").child(user_id).child(path).get().val()
+            user_dict = await cls._db.child('config').child('user').child(user_id).child(path).get() or {}
             return user_dict.get(key)
 
         # Not found
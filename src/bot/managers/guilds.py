@@ -1,11 +1,13 @@
 from __future__ import annotations
 
 import typing
-from typing import Set
+from typing import Tuple
 
 import aiocron
 from pytz import utc
 
+from ..utils.cache import LRUCache
+from ..utils.search import GuildIndex
 from ..utils.wynn import GuildMember
 
 if typing.TYPE_CHECKING:
@@ -13,16 +15,36 @@ if typing.TYPE_CHECKING:
 
 
 class GuildMemberManager:
+    """Reads guild members from the database through a TTL + LRU cache"""
+    CACHE_SIZE = 256
+    CACHE_TTL = 300
+
     def __init__(self, bot: 'EYESBot'):
         self.bot = bot
+        self.cache = LRUCache(self.CACHE_SIZE, ttl=self.CACHE_TTL)
 
     def path(self):
-        self.bot.db.path = None
         return self.bot.db.child('wynncraft').child('guilds')
 
-    def get(self, guild_name) -> Set[GuildMember]:
-        members = self.path().child(guild_name).child('members').get().val() or []
-        return set(GuildMember(uuid=k, **v) for k, v in members.items())
+    @staticmethod
+    def build(members: dict) -> Tuple[GuildMember, ...]:
+        return tuple(GuildMember(uuid=k, **v) for k, v in members.items())
+
+    async def get(self, guild_name) -> Tuple[GuildMember, ...]:
+        if (cached := self.cache.get(guild_name)) is not None:
+            return cached
+
+        members = self.build(await self.path().child(guild_name).child('members').get() or {})
+        self.cache.set(guild_name, members)
+        return members
+
+    def refresh(self, guild_name, members: dict):
+        """Replaces a cached entry with freshly written members, if it is cached at all"""
+        if guild_name in self.cache:
+            self.cache.set(guild_name, self.build(members))
+
+    def invalidate(self, guild_name):
+        self.cache.invalidate(guild_name)
 
 
 class GuildPrefixManager:
@@ -30,18 +52,19 @@ class GuildPrefixManager:
         self.bot = bot
         self.p2g = {}
         self.g2p = {}
+        self.index = GuildIndex()
 
         self.update().call_func()
         self.update().start()
 
     def path(self):
-        self.bot.db.path = None
         return self.bot.db.child('wynncraft').child('prefixes')
 
     def update(self):
         @aiocron.crontab("5 * * * *", start=False, tz=utc)
         async def wrapper():
-            self.p2g = self.path().get().val()
+            self.p2g = await self.path().get() or {}
             self.g2p = {v: k for k, v in self.p2g.items()}
+            self.index.update(self.g2p)
 
         return wrapper
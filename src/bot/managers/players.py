@@ -1,45 +1,160 @@
 from __future__ import annotations
 
 import asyncio
+import sys
 import time
 import typing
-from functools import reduce
+from array import array
+from datetime import datetime as dt
+from typing import Awaitable, Callable, Iterator, Optional
 
-import aiohttp
+from aiohttp import ClientError
 
 if typing.TYPE_CHECKING:
     from ..bot import EYESBot
 
 
+class PlayerSnapshot:
+    """
+    The online players from one poll, built in a single pass over the API response.
+
+    Names are interned and mapped to an index into a compact array holding the index
+    of their world, alongside the member list of every world.
+    """
+    __slots__ = ('worlds', 'members', 'index', 'world_of')
+
+    def __init__(self):
+        self.worlds: list[str] = []
+        self.members: list[list[str]] = []
+        self.index: dict[str, int] = {}
+        self.world_of = array('H')
+
+    @classmethod
+    def from_response(cls, response: dict[str, list[str]]) -> PlayerSnapshot:
+        self = cls()
+        index, world_of, intern = self.index, self.world_of, sys.intern
+        for world, names in response.items():
+            if world == 'request':
+                continue
+
+            w = len(self.worlds)
+            self.worlds.append(world)
+            # The response's lists are reused in place rather than copied
+            self.members.append(names)
+            for j, name in enumerate(names):
+                names[j] = name = intern(name)
+                # A player listed on two worlds ends up on the last one
+                if (i := index.get(name)) is None:
+                    index[name] = len(world_of)
+                    world_of.append(w)
+                else:
+                    world_of[i] = w
+        return self
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name: str):
+        return name in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def world(self, name: str) -> Optional[str]:
+        i = self.index.get(name)
+        return self.worlds[self.world_of[i]] if i is not None else None
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        worlds, world_of = self.worlds, self.world_of
+        return ((name, worlds[world_of[i]]) for name, i in self.index.items())
+
+
+class PlayerDiff:
+    """The changes in online players between two polls"""
+    __slots__ = ('timestamp', 'online', 'joined', 'left', 'moved')
+
+    def __init__(self, timestamp: int, online: PlayerSnapshot, joined: set[str], left: set[str],
+                 moved: dict[str, tuple[str, str]]):
+        self.timestamp = timestamp
+        self.online = online
+        self.joined = joined
+        self.left = left
+        # name -> (old world, new world)
+        self.moved = moved
+
+    def __repr__(self):
+        return f"<PlayerDiff joined={len(self.joined)} left={len(self.left)} moved={len(self.moved)}>"
+
+
 class PlayerManager:
     """Manages, and updates the current online players"""
     def __init__(self, bot: 'EYESBot'):
         self.bot = bot
 
-        self.dict: dict = {}
-        self.all: set[str] = set()
-        self.worlds: dict = {}
+        self.snapshot = PlayerSnapshot()
+        # World -> how many players are online on it
+        self.population: dict[str, int] = {}
+
+        self.subscribers: list[Callable[[PlayerDiff], Awaitable]] = []
 
     def run(self):
         asyncio.create_task(self.update())
 
+    def subscribe(self, callback: Callable[[PlayerDiff], Awaitable]):
+        """Registers a coroutine function to be called with the diff of every poll"""
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[PlayerDiff], Awaitable]):
+        self.subscribers.remove(callback)
+
+    def diff(self, snapshot: PlayerSnapshot) -> PlayerDiff:
+        old = self.snapshot
+        joined = snapshot.index.keys() - old.index.keys()
+        left = old.index.keys() - snapshot.index.keys()
+        moved = {}
+        for name, world in snapshot.items():
+            if (previous := old.world(name)) is not None and previous != world:
+                moved[name] = (previous, world)
+        return PlayerDiff(int(dt.utcnow().timestamp()), snapshot, joined, left, moved)
+
+    async def publish(self, diff: PlayerDiff):
+        results = await asyncio.gather(*(callback(diff) for callback in self.subscribers), return_exceptions=True)
+        for callback, result in zip(self.subscribers, results):
+            if isinstance(result, Exception):
+                self.bot.logger.error(f"Player subscriber {callback.__qualname__} failed: {result!r}")
+
+    def count_population(self, diff: PlayerDiff, old: PlayerSnapshot):
+        """Keeps the per-world player counts up to date from the churn alone, dropping worlds that emptied"""
+        def count(world: str, change: int):
+            if population := self.population.get(world, 0) + change:
+                self.population[world] = population
+            else:
+                del self.population[world]
+
+        for name in diff.left:
+            count(old.world(name), -1)
+        for name in diff.joined:
+            count(diff.online.world(name), 1)
+        for previous, world in diff.moved.values():
+            count(previous, -1)
+            count(world, 1)
+
     async def update(self):
         t = time.perf_counter()
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://api.wynncraft.com/public_api.php?action=onlinePlayers") as response:
-                if not response.ok:
-                    return
+        try:
+            response = await self.bot.wynn.online_players()
+        except ClientError as e:
+            self.bot.logger.error(f"Connection Error while fetching online players: {e}")
+        else:
+            snapshot = PlayerSnapshot.from_response(response)
+            diff = self.diff(snapshot)
 
-                players = await response.json()
+            old = self.snapshot
+            self.snapshot = snapshot
 
-        del players['request']
-        self.dict = players
-        self.all = set(sum(players.values(), []))
-        self.worlds = reduce(lambda a, b: a | b, map(lambda i: {x: i[0] for x in i[1]}, self.dict.items()))
+            self.count_population(diff, old)
 
-        # Update playtime
-        if playtime := self.bot.tasks.get('PlayerPlaytimeUpdater'):
-            playtime.update(self.all)
+            await self.publish(diff)
 
         await asyncio.sleep(30 - (time.perf_counter() - t))
         asyncio.create_task(self.update())
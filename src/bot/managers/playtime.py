@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+from datetime import datetime as dt
+
+from ..utils.playtime import MAX_SESSION, POLL_MINUTES, session_overlap, sessions_from_hourly
+from ..utils.timeseries import DAY, WINDOWS, RollingWindows, bucket_of
+
+if typing.TYPE_CHECKING:
+    from ..bot import EYESBot
+
+
+class PlaytimeManager:
+    """
+    Answers playtime queries:
+      - recent playtime from rolling window totals, or at most two running total lookups
+      - playtime in any time range from the player's stored (and currently open) sessions
+    """
+    # How many players a leaderboard fetches at once
+    CONCURRENCY = 25
+
+    def __init__(self, bot: 'EYESBot'):
+        self.bot = bot
+        # Kept up to date by PlayerPlaytimeGrouper
+        self.windows = RollingWindows(self.path, lambda player, days: f'{player}/{days}d')
+
+    def path(self):
+        return self.bot.db.child('wynncraft').child('playtime')
+
+    def hourly_path(self):
+        return self.path().child('players')
+
+    def sessions_path(self):
+        return self.path().child('sessions')
+
+    def last_seen_path(self):
+        return self.path().child('lastseen')
+
+    def windows_path(self):
+        return self.path().child('windows')
+
+    def cumulative_path(self):
+        return self.path().child('cumulative')
+
+    def unflushed(self, player: str, since: int) -> float:
+        """Minutes counted in memory, in buckets after `since`, that haven't been ingested by the grouper yet"""
+        if not (updater := self.bot.tasks.get('PlayerPlaytimeUpdater')):
+            return 0
+
+        minutes = 0
+        for accumulator in (*updater.finished, updater.accumulator):
+            if accumulator.bucket > since and (i := accumulator.index.get(player)) is not None:
+                minutes += POLL_MINUTES * accumulator.counts[i]
+        return minutes
+
+    async def running_total(self, player: str, timestamp: int) -> float:
+        """A player's total playtime up to a timestamp, from the last running total before it"""
+        data = await self.cumulative_path().child(player).order_by_key().end_at(str(timestamp)).limit_to_last(1).get()
+        return next(iter(data.values()), 0)
+
+    async def recent(self, player: str, days: int) -> int:
+        """A player's playtime in minutes over the last few days, that is the hourly buckets after `days` ago"""
+        now = int(dt.utcnow().timestamp())
+        since = bucket_of(now) - days * DAY
+
+        # The windows cover the same buckets as the running totals, once they are expired up to this hour
+        if days in WINDOWS and self.windows.state == bucket_of(now):
+            minutes = await self.windows_path().child(player).child(f'{days}d').get() or 0
+        else:
+            grouper = self.bot.tasks.get('PlayerPlaytimeGrouper')
+            if grouper and grouper.ready:
+                total = grouper.totals.get(player, 0)
+            else:
+                total = await self.running_total(player, now)
+            minutes = total - await self.running_total(player, since)
+
+        return int(minutes + self.unflushed(player, since))
+
+    async def sessions(self, player: str, start: int, end: int) -> dict[int, int]:
+        """Gets every session of a player that overlaps [start, end]"""
+        data = await self.sessions_path().child(player) \
+            .order_by_key().start_at(str(start - MAX_SESSION)).end_at(str(end)).get()
+        sessions = {int(k): v for k, v in data.items() if v >= start}
+
+        # The player's current session hasn't been written yet
+        if updater := self.bot.tasks.get('PlayerPlaytimeUpdater'):
+            if (open_start := updater.sessions.open.get(player)) is not None and open_start <= end:
+                sessions[open_start] = int(dt.utcnow().timestamp())
+
+        return sessions
+
+    async def playtime(self, player: str, start: int, end: int) -> int:
+        """A player's playtime in minutes between two timestamps"""
+        return session_overlap(await self.sessions(player, start, end), start, end) // 60
+
+    async def last_seen(self, player: str) -> int:
+        """When a player was last online, or -1 if never"""
+        if player in self.bot.players.snapshot:
+            return int(dt.utcnow().timestamp())
+
+        if (last_seen := await self.last_seen_path().child(player).get()) is not None:
+            return last_seen
+
+        # Not indexed yet, so we fall back to the end of their latest session and index that
+        sessions = await self.sessions_path().child(player).order_by_key().limit_to_last(1).get()
+        last_seen = next(iter(sessions.values()), -1)
+
+        if last_seen >= 0:
+            await self.bot.writes.set(self.last_seen_path().child(player), last_seen)
+        return last_seen
+
+    async def migrate(self, batch_size: int = 50):
+        """
+        Converts the hourly playtime blocks into sessions, and removes them.
+        Each batch of players is converted and removed in one update,
+        so an interrupted run resumes where it left off.
+        """
+        players = await self.hourly_path().shallow()
+        if not players:
+            return
+        self.bot.logger.info(f"Migrating playtime of {len(players)} players to sessions.")
+
+        async def convert(player):
+            hours = await self.hourly_path().child(player).get() or {}
+            update_dict = {f'sessions/{player}/{s}': e for s, e in sessions_from_hourly(hours).items()}
+            update_dict[f'players/{player}'] = None
+            return update_dict
+
+        for i in range(0, len(players), batch_size):
+            update_dict = {}
+            for converted in await asyncio.gather(*map(convert, players[i:i + batch_size])):
+                update_dict.update(converted)
+            await self.path().update(update_dict)
+            self.bot.logger.info(f"Migrated {min(i + batch_size, len(players))}/{len(players)} players.")
+
+    async def last_seen_many(self, players: list[str]) -> dict[str, int]:
+        """When each of many players was last online, fetched concurrently"""
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def fetch(player):
+            async with semaphore:
+                return player, await self.last_seen(player)
+
+        return dict(await asyncio.gather(*map(fetch, players)))
+
+    async def guild_last_seen(self, guild_name: str) -> dict[str, int]:
+        """When each member of a guild was last online"""
+        return await self.last_seen_many([m.name for m in await self.bot.guilds.get(guild_name)])
+
+    async def leaderboard(self, players: list[str], days: int) -> list[tuple[str, int, int]]:
+        """
+        Gets (name, playtime, last seen) for many players, sorted by playtime.
+        Players are fetched concurrently, bounded by a semaphore.
+        """
+        semaphore = asyncio.Semaphore(self.CONCURRENCY)
+
+        async def fetch(player):
+            async with semaphore:
+                playtime, last_seen = await asyncio.gather(self.recent(player, days), self.last_seen(player))
+            return player, playtime, last_seen
+
+        results = await asyncio.gather(*map(fetch, players))
+        return sorted(results, key=lambda x: (-x[1], -x[2], x[0]))
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import typing
+from collections import OrderedDict
+
+from ..utils.timeseries import RollingWindows
+from ..utils.xp import TIERS, Tier, rollup_members, tier_bucket
+
+if typing.TYPE_CHECKING:
+    from ..bot import EYESBot
+
+
+class XPManager:
+    """
+    Answers guild XP queries from the raw points and their downsampled tiers.
+
+    Every point lives in exactly one tier, so a range is answered by reading each tier
+    over it and merging. Ranges reaching into older tiers are accurate to their bucket size.
+
+    The last 1, 7, 14 and 30 days are also kept as rolling window totals, rolling by the hour,
+    which answer leaderboards with a single read however much history there is.
+    """
+
+    def __init__(self, bot: 'EYESBot'):
+        self.bot = bot
+        # Added to by GuildUpdater, and expired by GuildXPRollup
+        self.windows = RollingWindows(self.path, self.window_key)
+
+    @staticmethod
+    def window_key(key: str, days: int) -> str:
+        """Where a key of the windows' index, guilds/{guild} or contributed/{guild}/{uuid}, is in a window"""
+        kind, guild, *member = key.split('/')
+        return f'guilds/{days}d/{guild}' if kind == 'guilds' else f'contributed/{guild}/{days}d/{member[0]}'
+
+    def path(self):
+        return self.bot.db.child('wynncraft').child('xp')
+
+    def windows_path(self):
+        return self.path().child('windows')
+
+    def tier_path(self, tier: Tier):
+        # Raw points are where GuildUpdater has always written them
+        return self.path() if tier.size == 0 else self.path().child(tier.name)
+
+    async def _read(self, kind: str, guild: str, start: int, end: int) -> list[OrderedDict]:
+        async def read(tier):
+            # A bucket starting before the range still covers its start
+            query = self.tier_path(tier).child(kind).child(guild).order_by_key()
+            return await query.start_at(str(tier_bucket(start, tier.size))).end_at(str(end)).get()
+
+        return await asyncio.gather(*map(read, TIERS))
+
+    async def series(self, guild: str, start: int, end: int, size: int = 0) -> OrderedDict:
+        """A guild's XP gained in [start, end] as timestamp -> xp, optionally resampled into buckets of `size`"""
+        points = {}
+        for data in await self._read('guilds', guild, start, end):
+            for k, v in data.items():
+                b = tier_bucket(int(k), size)
+                points[b] = points.get(b, 0) + v
+        return OrderedDict(sorted(points.items()))
+
+    async def member_series(self, guild: str, start: int, end: int, size: int = 0) -> OrderedDict:
+        """Member XP (by uuid) contributed to a guild in [start, end] as timestamp -> uuid -> xp, like series"""
+        points = {}
+        for data in await self._read('contributed', guild, start, end):
+            for b, members in rollup_members(data, size).items():
+                bucket = points.setdefault(b, {})
+                for uuid, v in members.items():
+                    bucket[uuid] = bucket.get(uuid, 0) + v
+        return OrderedDict(sorted(points.items()))
+
+    async def total(self, guild: str, start: int, end: int) -> float:
+        return sum((await self.series(guild, start, end)).values())
+
+    async def member_totals(self, guild: str, start: int, end: int) -> dict[str, int]:
+        """The XP each member (by uuid) contributed to a guild in [start, end]"""
+        totals = {}
+        for data in await self._read('contributed', guild, start, end):
+            for members in data.values():
+                for uuid, v in members.items():
+                    totals[uuid] = totals.get(uuid, 0) + v
+        return totals
+
+    async def window(self, guild: str, days: int) -> dict[str, int]:
+        """The XP each member (by uuid) contributed to a guild over one of the rolling windows"""
+        members = await self.windows_path().child('contributed').child(guild).child(f'{days}d').get() or {}
+        return {uuid: xp for uuid, xp in members.items() if xp}
+
+    async def top_guilds(self, days: int, n: int = 100) -> list[tuple[str, int]]:
+        """The n guilds that gained the most XP over one of the rolling windows"""
+        guilds = await self.windows_path().child('guilds').child(f'{days}d').get() or {}
+        return heapq.nlargest(n, ((guild, xp) for guild, xp in guilds.items() if xp), key=lambda x: x[1])
@@ -79,14 +79,13 @@ class RemindCommand(SlashCommand, name="remind"):
         self.update().start()
 
     def path(self):
-        self.bot.db.path = None
         return self.bot.db.child('utils').child('reminders')
 
     async def remind(self, reminder_id: str, time: timedelta):
         async def _coro():
             await asyncio.sleep(time.total_seconds())
 
-            if not (data := self.path().child(reminder_id).get().val()):
+            if not (data := await self.path().child(reminder_id).get()):
                 return
 
             reminder = Reminder.from_data(data)
@@ -95,7 +94,7 @@ class RemindCommand(SlashCommand, name="remind"):
             reminder.next()
 
             await self.bot.bot.get_user(reminder.discord_id).send(reminder.reminder_str())
-            self.path().child(reminder_id).set(reminder.to_data())
+            await self.path().child(reminder_id).set(reminder.to_data())
 
         asyncio.create_task(_coro())
 
@@ -152,7 +151,7 @@ class RemindCommand(SlashCommand, name="remind"):
                             link='',
                             repeats=repeats,
                             repeat_interval=interval)
-        reminder_id = self.path().push(reminder.to_data())['name']
+        reminder_id = (await self.path().push(reminder.to_data())).key
 
         # This does cause some potential overlap, but overlaps will happen
         # with bot restarts/reconnects
@@ -164,20 +163,20 @@ class RemindCommand(SlashCommand, name="remind"):
             f"<t:{int(remind_time.timestamp())}>."
         )
 
-        self.path().child(reminder_id).child('link').set(response.jump_url)
+        await self.path().child(reminder_id).child('link').set(response.jump_url)
 
     def update(self):
         @aiocron.crontab("0 * * * *")
         async def wrapper():
             after_1h = dt.utcnow() + td(hours=1)
 
-            if not self.path().get().key():
+            if not await self.path().shallow():
                 return
 
-            reminders = self.path().order_by_child('timestamp').end_at(after_1h.timestamp()).get().each()
+            reminders = await self.path().order_by_child('timestamp').end_at(after_1h.timestamp()).get()
 
-            for reminder in reminders:
-                time = dt.fromtimestamp(reminder.val()['timestamp']) - dt.utcnow()
-                await self.remind(reminder.key(), time)
+            for reminder_id, reminder in reminders.items():
+                time = dt.fromtimestamp(reminder['timestamp']) - dt.utcnow()
+                await self.remind(reminder_id, time)
 
         return wrapper
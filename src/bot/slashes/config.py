@@ -38,15 +38,13 @@ class ConfigCommand(SlashCommand, name="config"):
         # Clean the path
         path = path.lower().strip().split('/')
         # Validate the path
-        allowed_paths = self.bot.db.child("paths").get().val().values()
+        allowed_paths = (await self.bot.db.child("paths").get() or {}).values()
         if path[0] not in allowed_paths:
             await ctx.respond("Invalid Path!")
             return
 
         # Child to the path
-        db_path = self.bot.db.child("config").child(scope)
-        for ext in path:
-            db_path = db_path.child(ext)
+        db_path = self.bot.db.child("config").child(scope).child(*path)
 
-        db_path.set(json.loads(value))
+        await db_path.set(json.loads(value))
         await ctx.respond("Done!")
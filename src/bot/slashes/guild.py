@@ -1,24 +1,24 @@
 import random
-import time
 from collections import OrderedDict
-from datetime import datetime as dt
-from itertools import product
 from typing import List, Dict
 
 from discord import ApplicationContext, Option, OptionChoice
 from discord import Embed
 from discord.utils import escape_markdown
-from fuzzywuzzy import fuzz, process
 
 from ..bot import EYESBot, SlashCommand
 from ..managers import ConfigManager
 from ..utils.paginator import ButtonPaginator
+from ..utils.search import AutocompleteCache
+from ..utils.timeseries import WINDOWS
 
 
 class GuildCommand(SlashCommand, name="guild"):
     def __init__(self, bot: EYESBot, guild_ids: list[int]):
         super().__init__(bot, guild_ids)
 
+        self.guild_completions = AutocompleteCache()
+
         self.group = self.bot.bot.create_group(
             "guild", "No Description", guild_ids=self.guild_ids
         )
@@ -32,6 +32,11 @@ class GuildCommand(SlashCommand, name="guild"):
         playtime = self.group.command()(self.playtime)
         playtime.options[0].autocomplete = self.guild_autocompleter
 
+        xp = self.group.command()(self.xp)
+        xp.options[0].autocomplete = self.guild_autocompleter
+
+        self.group.command()(self.xptop)
+
     def parse_guild(self, guild_name):
         if ' | ' in guild_name:
             return guild_name.partition(' | ')[2]
@@ -40,8 +45,8 @@ class GuildCommand(SlashCommand, name="guild"):
         else:
             return self.bot.prefixes.p2g.get(guild_name)
 
-    def parse_guilds(self, guilds_name):
-        guilds = ConfigManager.get("guildgroups", guilds_name)
+    async def parse_guilds(self, guilds_name):
+        guilds = await ConfigManager.get("guildgroups", guilds_name)
 
         # Not found => Not a group
         if guilds is None:
@@ -57,35 +62,9 @@ class GuildCommand(SlashCommand, name="guild"):
         return parsed_guilds, unparsed_guilds
 
     async def guild_autocompleter(self, ctx: ApplicationContext):
-        def generate_letters(letter):
-            """A simple function to generate the upper and lower case variants of a letter, in order."""
-            if len(letter) != 1 or not letter.isalpha():
-                raise ValueError
-
-            if letter.islower():
-                return [letter, letter.upper()]
-            else:
-                return [letter, letter.lower()]
-
-        if len(ctx.value) == 0:
-            return []
-
-        # We first try and do a case-insensitive guild prefix match if len <= 4
-        # by generating all possible combinations of upper/lowercase letters in the prefix
-        if len(ctx.value) <= 4:
-            try:
-                possible_letters = map(generate_letters, ctx.value)
-                possible_words = map(''.join, product(*possible_letters))
-            except ValueError:
-                prefix_match = []
-            else:
-                prefix_match = filter(None, map(self.bot.prefixes.p2g.get, possible_words))
-        else:
-            prefix_match = []
-
-        results = process.extract(ctx.value, self.bot.prefixes.g2p.keys(), scorer=fuzz.partial_ratio, limit=25)
-        guilds = list(zip(*results))[0]
-        guilds = [*prefix_match, *guilds]
+        # Tag matches come first, then names starting with what was typed, then fuzzy matches
+        index = self.bot.prefixes.index
+        guilds = await self.guild_completions.get(ctx.value, index.version, index.search)
         formatted_guilds = [OptionChoice(f"{self.bot.prefixes.g2p[gu]} | {gu}", gu) for gu in guilds]
         return formatted_guilds
 
@@ -96,8 +75,8 @@ class GuildCommand(SlashCommand, name="guild"):
         """Lists online players in a guild"""
         parsed = self.parse_guild(guild)
 
-        members = self.bot.guilds.get(parsed)
-        online_members = filter(lambda m: m.name in self.bot.players.all, members)
+        members = await self.bot.guilds.get(parsed)
+        online_members = filter(lambda m: m.name in self.bot.players.snapshot, members)
         sorted_members = list(sorted(online_members, key=lambda m: (-m.rank, m.name)))
 
         embed = Embed(title=f"{self.bot.prefixes.g2p[parsed]} | {parsed}", colour=random.getrandbits(24))
@@ -105,7 +84,7 @@ class GuildCommand(SlashCommand, name="guild"):
         if online_members:
             names = '\n'.join(map(lambda x: x.name, sorted_members))
             ranks = '\n'.join(map(lambda x: f"{'*' * x.rank:<5s}", sorted_members))
-            worlds = '\n'.join(map(lambda x: self.bot.players.worlds.get(x.name), sorted_members))
+            worlds = '\n'.join(map(lambda x: self.bot.players.snapshot.world(x.name), sorted_members))
             embed.add_field(name="Username", value=escape_markdown(names), inline=True)
             embed.add_field(name="Rank", value=escape_markdown(ranks), inline=True)
             embed.add_field(name="World", value=escape_markdown(worlds), inline=True)
@@ -117,7 +96,7 @@ class GuildCommand(SlashCommand, name="guild"):
             guild: Option(str, "guild to look up")
     ):
         """Shows information about online players/ranks for a guild"""
-        parsed_guilds, unparsed_guilds = self.parse_guilds(guild)
+        parsed_guilds, unparsed_guilds = await self.parse_guilds(guild)
 
         # Error handling
         if len(unparsed_guilds) == 1:
@@ -134,8 +113,8 @@ class GuildCommand(SlashCommand, name="guild"):
         key_ranks: Dict[str, OrderedDict] = {}
         for guild in parsed_guilds.values():
             # We construct sets for intersection for better time complexity
-            members = self.bot.guilds.get(guild)
-            online_members = filter(lambda m: m.name in self.bot.players.all, members)
+            members = await self.bot.guilds.get(guild)
+            online_members = filter(lambda m: m.name in self.bot.players.snapshot, members)
 
             # This counts how many of each rank are online
             ranks[guild] = [0] * 6
@@ -179,35 +158,11 @@ class GuildCommand(SlashCommand, name="guild"):
             days: Option(int, "how many days of playtime")
     ):
         """Shows the playtime leaderboard of a guild"""
-        now = int(dt.utcnow().timestamp())
-        prev = now - days * 86400
-
         guild = self.parse_guild(guild)
-        members = self.bot.guilds.get(guild)
-        playtime = []
+        members = await self.bot.guilds.get(guild)
 
-        total = len(members)
         await ctx.respond("Fetching data...")
-        start = time.time()
-
-        for i, member in enumerate(members):
-            # Progress bar
-            if time.time() - start > 5:
-                start = time.time()
-                await ctx.edit(content=f"Fetching data... ({i}/{total})")
-
-            # We default to empty dict as otherwise it might be an empty list
-            self.bot.db.path = None
-            online_times = self.bot.db.child('wynncraft').child('playtime').child('players').child(member.name) \
-                               .order_by_key().start_at(str(prev)).end_at(str(now)).get().val() or {}
-            member_playtime = int(sum(online_times.values()))
-
-            all_times = map(int, self.bot.db.child('wynncraft').child('playtime').child('players').child(member.name)
-                            .shallow().get().val() or [-1])
-            last_seen = max(all_times)
-            playtime.append((member.name, member_playtime, last_seen))
-
-        playtime.sort(key=lambda x: (-x[1], -x[2], x[0]))
+        playtime = await self.bot.playtime.leaderboard([m.name for m in members], days)
 
         names, playtimes, seens = zip(*playtime)
         seens = list(map(lambda x: f"<t:{x}:R>" if x >= 0 else "Never", seens))
@@ -218,3 +173,43 @@ class GuildCommand(SlashCommand, name="guild"):
         paginator = ButtonPaginator(ctx, f"{guild} {days}d Playtime", data, colour=random.getrandbits(24), text='')
 
         await paginator.generate_embed().respond()
+
+    async def xp(
+            self, ctx: ApplicationContext,
+            guild: Option(str, "guild to look up"),
+            days: Option(int, "how many days of xp", choices=list(WINDOWS))
+    ):
+        """Shows the contributed XP leaderboard of a guild"""
+        guild = self.parse_guild(guild)
+        if guild is None:
+            return await ctx.respond("Guild not found.")
+
+        await ctx.defer()
+        members = await self.bot.guilds.get(guild)
+        gained = await self.bot.xp.window(guild, days)
+        if not gained:
+            return await ctx.send_followup(f"{guild} hasn't gained any XP in the last {days}d.")
+
+        names = {m.uuid: m.name for m in members}
+        leaderboard = sorted(gained.items(), key=lambda x: (-x[1], names.get(x[0], '')))
+        data = {"Member": [names.get(uuid, "Former member") for uuid, _ in leaderboard],
+                "XP": [f"{xp:,}" for _, xp in leaderboard]}
+
+        paginator = ButtonPaginator(ctx, f"{guild} {days}d XP", data, colour=random.getrandbits(24), text='')
+        await paginator.generate_embed().respond()
+
+    async def xptop(
+            self, ctx: ApplicationContext,
+            days: Option(int, "how many days of xp", choices=list(WINDOWS))
+    ):
+        """Shows the guilds that gained the most XP"""
+        await ctx.defer()
+        top = await self.bot.xp.top_guilds(days)
+        if not top:
+            return await ctx.send_followup(f"No guild has gained any XP in the last {days}d.")
+
+        data = {"Guild": [f"{self.bot.prefixes.g2p.get(gu, '?')} | {gu}" for gu, _ in top],
+                "XP": [f"{xp:,}" for _, xp in top]}
+
+        paginator = ButtonPaginator(ctx, f"Top Guilds {days}d XP", data, colour=random.getrandbits(24), text='')
+        await paginator.generate_embed().respond()
@@ -1,5 +1,3 @@
-from datetime import datetime as dt
-
 from discord import ApplicationContext, Option
 
 from ..bot import EYESBot, SlashCommand
@@ -11,19 +9,9 @@ class PlaytimeCommand(SlashCommand, name="playtime"):
 
         self.register(self.playtime)
 
-    def playerpath(self):
-        self.bot.db.path = None
-        return self.bot.db.child('wynncraft').child('playtime').child('players')
-
     async def playtime(self, ctx: ApplicationContext,
                        player: Option(str, "whose playtime to view"),
                        days: Option(int, "how many days of playtime")):
         """Shows a player's playtime"""
-        now = int(dt.utcnow().timestamp())
-        prev = now - days * 86400
-
-        # We default to empty dict as otherwise it might be an empty list
-        online_times = self.playerpath().child(player) \
-                           .order_by_key().start_at(str(prev)).end_at(str(now)).get().val() or {}
-        pt = int(sum(online_times.values()))
+        pt = await self.bot.playtime.recent(player, days)
         await ctx.respond(f"`{player}`'s `{days}d` playtime: `{pt // 60}h{pt % 60}m`")
@@ -1,7 +1,7 @@
 import random
 import time
 
-import aiohttp
+from aiohttp import ClientError
 from discord import ApplicationContext, Option
 
 from ..bot import EYESBot, SlashCommand
@@ -16,14 +16,13 @@ class SoulPointCommand(SlashCommand, name="sp"):
 
     async def callback(self, ctx: ApplicationContext,
                        offset: Option(int, "offset for soulpoint regen in seconds", required=False) = 60):
-        """Shows a list of worlds, sorted by closest to next soul point regen tick"""
+        """Shows a list of worlds and their player counts, sorted by closest to next soul point regen tick"""
         await ctx.defer()
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://athena.wynntils.com/cache/get/serverList") as res:
-                if not res.ok:
-                    return await ctx.edit("Fetching from SP API failed!", ephemeral=True)
-                data = await res.json()
+        try:
+            data = await self.bot.http.get("https://athena.wynntils.com/cache/get/serverList")
+        except ClientError:
+            return await ctx.edit("Fetching from SP API failed!", ephemeral=True)
 
         now = time.time_ns() // (10 ** 9)
         s_20min = 20 * 60
@@ -31,6 +30,7 @@ class SoulPointCommand(SlashCommand, name="sp"):
                          for k, v in data['servers'].items()), key=lambda x: (x[1], x[0]))
 
         worlds, times = zip(*worlds)
-        data = {"World": worlds, "Time": [f"{t // 60}m{t % 60}s" for t in map(lambda t: t + offset, times)]}
+        data = {"World": worlds, "Time": [f"{t // 60}m{t % 60}s" for t in map(lambda t: t + offset, times)],
+                "Players": [self.bot.players.population.get(w, 0) for w in worlds]}
         paginator = ButtonPaginator(ctx, f"Soul Point Regen", data, colour=random.getrandbits(24), text='')
         await paginator.generate_embed().respond()
@@ -5,19 +5,26 @@ from datetime import timedelta as td
 from typing import Optional
 
 import aiocron
-import aiohttp
-import requests
+from aiohttp import ClientError
 from pytz import utc
 
 from ..bot import EYESBot, BotTask
-from ..utils.wynn import GuildMember
+from ..utils.timeseries import DAY, bucket_of
+from ..utils.scheduling import AdaptivePolicy, Observation
+from ..utils.wynn import decode_members, diff_members
 
 
-# TODO: GuildListUpdater should also trigger an update for GuildUpdater
 class GuildListUpdater(BotTask):
+    """Keeps the list of guilds up to date, and tells GuildUpdater which guilds were added or removed"""
+
     def __init__(self, bot: EYESBot):
         super().__init__(bot)
 
+        # The guilds from the last update, only read from the database the first time
+        self.known: Optional[set[str]] = None
+        # (added, removed) guilds, for GuildUpdater
+        self.changes: asyncio.Queue = asyncio.Queue()
+
         # Do one update at the start
         self.update().call_func()
         self.update().start()
@@ -25,167 +32,283 @@ class GuildListUpdater(BotTask):
     def path(self):
         return self.bot.db.child('wynncraft').child('guilds')
 
+    def schedule_path(self):
+        return self.bot.db.child('wynncraft').child('guildschedule')
+
     def update(self):
         @aiocron.crontab("0 */3 * * *", start=False, tz=utc)
         async def wrapper():
-            response = requests.get("https://api.wynncraft.com/public_api.php?action=guildList")
-
-            if not response.ok:
-                self.bot.logger.error("Failed to fetch from Wynn API!")
+            try:
+                guilds = await self.bot.wynn.guild_list()
+            except ClientError as e:
+                self.bot.logger.error(f"Failed to fetch from Wynn API: {e}")
                 return
-            else:
-                response = response.json()
 
-            existing_guilds = self.path().shallow().get().val() or []
+            if self.known is None:
+                self.known = set(await self.path().shallow())
+            guilds = set(guilds)
+            new_guilds = guilds - self.known
+            removed_guilds = self.known - guilds
 
-            guilds = response['guilds']
-            one_day = td(days=1).total_seconds()
-            guilddict = {g: {'name': g, 'interval': one_day, 'no_diff_days': 0, 'next_update': 0}
-                         for g in guilds if g not in existing_guilds}
+            if new_guilds:
+                now = dt.now().timestamp()
+                await self.path().update({g: {'name': g} for g in new_guilds})
+                await self.schedule_path().update({g: {'next_update': now} for g in new_guilds})
 
-            self.path().update(guilddict)
+            self.known = guilds
+            if new_guilds or removed_guilds:
+                self.changes.put_nowait((new_guilds, removed_guilds))
 
         return wrapper
 
 
 class GuildUpdater(BotTask):
     """A priority-queue-based implementation to update guild details
-       with exponential backoff strategy and rate limit handling"""
+       with exponential backoff strategy and rate limit handling
+
+       A pool of workers takes due guilds from the queue concurrently, all under the
+       shared Wynncraft API rate limit. Normally only a few of them run, leaving budget
+       for everything else, but when the queue falls behind (e.g. after downtime) every
+       worker joins in until it has caught up.
+
+       When each guild is next updated is up to the scheduling policy, which spreads a
+       daily budget of updates, a share of the API rate limit, over the guilds so that
+       they are out of date as little as possible."""
+    WORKERS = 2
+    BURST_WORKERS = 8
+    # The share of the Wynncraft API rate limit the scheduling policy spends on guild updates,
+    # leaving the rest for polling online players, the guild list and commands
+    API_SHARE = 0.5
+    # How far behind the most overdue guild has to be before we burst
+    BURST_LAG = td(minutes=30).total_seconds()
+    # How long to wait before retrying a guild whose update failed
+    RETRY_DELAY = td(minutes=15).total_seconds()
+    # The longest a worker sleeps before checking the queue again
+    IDLE = 5
 
     def __init__(self, bot):
         super().__init__(bot)
 
         self.pq = []
-        self.build_pq()
+        # guild -> its next_update, last_update and the policy's estimates, mirroring the schedule index
+        self.schedules: dict[str, dict] = {}
+        self.policy = AdaptivePolicy(self.bot.wynn.limiter.rate * DAY * self.API_SHARE)
+        self.wakeup = asyncio.Event()
+        self.workers: list[asyncio.Task] = []
+
+        self.updated = 0
+        self.failed = 0
 
-        asyncio.create_task(self.next())
+        asyncio.create_task(self.start())
+        self.report().start()
 
     def guild_path(self):
-        self.bot.db.path = None
         return self.bot.db.child('wynncraft').child('guilds')
 
+    def schedule_path(self):
+        return self.bot.db.child('wynncraft').child('guildschedule')
+
     def deleted_path(self):
-        self.bot.db.path = None
         return self.bot.db.child('wynncraft').child('deleted_guilds')
 
     def prefix_path(self):
-        self.bot.db.path = None
         return self.bot.db.child('wynncraft').child('prefixes')
 
     def xp_path(self):
-        self.bot.db.path = None
         return self.bot.db.child('wynncraft').child('xp')
 
-    async def next(self):
-        if self.pq:  # is not empty
-            # We check that it is in fact time to update the smallest item
-            if dt.now().timestamp() > self.pq[0][0]:
-                # Gets the first element and updates it
-                _, guild_name = heapq.heappop(self.pq)
-                if next_update := await self.update_guild(guild_name):
-                    # Re-adds it back to the queue with the scheduled next update
-                    heapq.heappush(self.pq, (next_update, guild_name))
-
-        # 1 request per 5s
-        await asyncio.sleep(5)
-        asyncio.create_task(self.next())
-
-    def build_pq(self):
-        guilds = self.guild_path().get().each()
-        for guild in guilds:
-            guild_name = guild.key()
-            timestamp = guild.val().get('next_update', 0)
-            heapq.heappush(self.pq, (timestamp, guild_name))
-
-    @staticmethod
-    def calc_next_interval(interval, no_diff_days, num_changes) -> td:
-        MIN_INTERVAL = td(hours=6)
-        MAX_INTERVAL = td(days=8)
-
-        # If diff = 0 for more than 5 days, increase interval
-        if num_changes == 0:
-            if interval < td(days=1) and no_diff_days >= 2:
-                interval = td(days=1)
-            elif no_diff_days >= 4:
-                interval *= 2
-        elif num_changes != 0:
-            if interval > td(days=1):
-                interval = td(days=1)
-            elif num_changes > 1:
-                interval /= 2
-
-        interval = max(min(interval, MAX_INTERVAL), MIN_INTERVAL)
-        return interval
+    async def start(self):
+        await self.build_pq()
+        self.workers = [asyncio.create_task(self.worker(i)) for i in range(self.BURST_WORKERS)]
+        if guild_list := self.bot.tasks.get('GuildListUpdater'):
+            self.workers.append(asyncio.create_task(self.listen(guild_list.changes)))
+
+    async def listen(self, changes: asyncio.Queue):
+        """Schedules guilds as soon as GuildListUpdater finds them"""
+        while True:
+            added, removed = await changes.get()
+            now = dt.now().timestamp()
+            for guild_name in added:
+                # Guilds already loaded from the schedule index are queued already
+                if guild_name not in self.schedules:
+                    self.schedule(guild_name, now)
+            # An update of a removed guild confirms it's gone, and moves it to deleted_guilds
+            for guild_name in removed:
+                if guild_name in self.schedules:
+                    self.schedule(guild_name, now)
+            self.bot.logger.info(f"Scheduled {len(added)} new and {len(removed)} removed guilds.")
+
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+
+    def schedule(self, guild_name: str, timestamp: float):
+        # Any earlier entry for this guild in the queue becomes stale, and is skipped when it comes up
+        self.schedules.setdefault(guild_name, {})['next_update'] = timestamp
+        heapq.heappush(self.pq, (timestamp, guild_name))
+        self.wakeup.set()
+
+    def lag(self) -> float:
+        """How many seconds the most overdue guild is behind, 0 if none are due"""
+        # From the schedules rather than the queue, which also holds stale entries
+        first = min((schedule['next_update'] for schedule in self.schedules.values()), default=None)
+        return max(dt.now().timestamp() - first, 0) if first is not None else 0
+
+    def queue_depth(self) -> int:
+        """How many guilds are due for an update"""
+        now = dt.now().timestamp()
+        return sum(1 for schedule in self.schedules.values() if schedule['next_update'] <= now)
+
+    @property
+    def bursting(self) -> bool:
+        return self.lag() > self.BURST_LAG
+
+    async def take(self, worker: int) -> str:
+        """Waits until a guild is due, and this worker is allowed to update it"""
+        while True:
+            now = dt.now().timestamp()
+            if self.pq and self.pq[0][0] <= now and (worker < self.WORKERS or self.bursting):
+                timestamp, guild_name = heapq.heappop(self.pq)
+                # Entries of guilds that were rescheduled or deleted since are skipped
+                if guild_name in self.schedules and self.schedules[guild_name]['next_update'] == timestamp:
+                    return guild_name
+                continue
+
+            # Due guilds that this worker isn't allowed to take are checked again after IDLE
+            delay = self.pq[0][0] - now if self.pq else self.IDLE
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay if 0 < delay < self.IDLE else self.IDLE)
+            except asyncio.TimeoutError:
+                pass
+
+    async def worker(self, worker: int):
+        while True:
+            guild_name = await self.take(worker)
+            try:
+                next_update = await self.update_guild(guild_name)
+            except Exception as e:
+                self.bot.logger.error(f"Failed to update guild {guild_name}: {e!r}")
+                next_update = dt.now().timestamp() + self.RETRY_DELAY
+
+            if next_update:
+                # Re-adds it back to the queue with the scheduled next update
+                self.schedule(guild_name, next_update)
+
+    async def build_pq(self):
+        """Builds the queue from the schedule index alone, so no members are downloaded"""
+        self.schedules = await self.schedule_path().get() or {}
+        if not self.schedules:
+            await self.build_schedules()
+
+        # Guilds that were never updated are due now
+        now = dt.now().timestamp()
+        for schedule in self.schedules.values():
+            schedule['next_update'] = schedule.get('next_update') or now
+
+        self.pq = [(schedule['next_update'], guild_name) for guild_name, schedule in self.schedules.items()]
+        heapq.heapify(self.pq)
+        self.policy.load(self.schedules)
+
+    async def build_schedules(self):
+        """Creates the schedule index from the scheduling info in every guild, which is only needed once"""
+        self.bot.logger.info("Building the guild schedule index.")
+        guilds = await self.guild_path().get() or {}
+        self.schedules = {guild_name: {'next_update': guild.get('next_update', 0)}
+                          for guild_name, guild in guilds.items()}
+        if self.schedules:
+            await self.schedule_path().set(self.schedules)
 
     async def update_guild(self, guild_name) -> Optional[float]:
         """Fetches 1 guild from the API and updates it."""
         self.bot.logger.info(f"Updating Guild {guild_name}.")
 
-        url = f"https://api.wynncraft.com/public_api.php?action=guildStats&command={guild_name}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if not response.ok:
-                    self.bot.logger.error(f"Failed to fetch from {url}.")
-                    return
-                else:
-                    response = await response.json()
-
-        # Check for error: guild not found
-        if response.get("error") == "Guild not found":
+        try:
+            response = await self.bot.wynn.guild_stats(guild_name)
+        except ClientError as e:
+            self.bot.logger.error(f"Failed to fetch guild {guild_name}: {e}")
+            self.failed += 1
+            # Try again later rather than dropping the guild from the queue
+            return dt.now().timestamp() + self.RETRY_DELAY
+
+        # The guild was not found
+        if response is None:
             # The guild was deleted, so we add it to deleted_guilds and remove it from guilds
-            last_info = self.guild_path().child(guild_name).get().val()
-            self.guild_path().child(guild_name).remove()
+            last_info = await self.guild_path().child(guild_name).get() or {}
+            await self.bot.writes.remove(self.guild_path().child(guild_name))
             last_info['deleted'] = dt.now().timestamp()
-            self.deleted_path().child(guild_name).set(last_info)
+            await self.bot.writes.set(self.deleted_path().child(guild_name), last_info)
+            await self.bot.writes.remove(self.schedule_path().child(guild_name))
+            self.schedules.pop(guild_name, None)
+            self.policy.remove(guild_name)
+            self.bot.guilds.invalidate(guild_name)
             return
 
         # We grab the prefix and additionally add it to a prefix path for faster lookups
         prefix = response['prefix']
-        self.prefix_path().child(prefix).set(guild_name)
-
-        # Now we get the members and return a number for change between this and last iteration
-        members = map(lambda m: GuildMember.from_data(m).to_dict_item(), response['members'])
-        memberdict = dict(members)
-        memberdict_old = self.guild_path().child(guild_name).child('members').get().val() or {}
-        num_changes = len(memberdict.keys() | memberdict_old.keys()) - len(memberdict.keys() & memberdict_old.keys())
-        self.guild_path().child(guild_name).child('members').set(memberdict)
-
-        # Calculate XP transitions
-        await self.update_xp(guild_name, memberdict_old, memberdict)
+        await self.bot.writes.set(self.prefix_path().child(prefix), guild_name)
 
-        # Record this update
-        interval = self.guild_path().child(guild_name).child('interval').get().val() or td(days=1).total_seconds()
+        members_path = self.guild_path().child(guild_name).child('members')
+        memberdict_old = await members_path.get() or {}
 
-        if num_changes == 0:
-            no_diff_days = self.guild_path().child(guild_name).child('no_diff_days').get().val() or 0
-            no_diff_days += interval / (60 * 60 * 24)
-        else:
-            no_diff_days = 0
+        # One diff gives us the writes, how much the guild changed, and the XP gained
+        memberdict = decode_members(response['members'])
+        diff = diff_members(memberdict_old, memberdict)
+        if diff.changes:
+            await self.bot.writes.update(members_path, diff.changes)
+        self.bot.guilds.refresh(guild_name, memberdict)
 
-        next_interval = self.calc_next_interval(td(seconds=interval), no_diff_days, num_changes)
-        next_update = dt.now() + next_interval
+        # Calculate XP transitions
+        await self.update_xp(guild_name, diff.gained)
 
-        self.guild_path().child(guild_name).update({
+        await self.bot.writes.update(self.guild_path().child(guild_name), {
             "level": response['level'],
-            "size": len(memberdict),
-            "interval": next_interval.total_seconds(),
-            "no_diff_days": no_diff_days,
-            "next_update": next_update.timestamp()
+            "size": len(memberdict)
         })
 
-        return next_update.timestamp()
-
-    async def update_xp(self, guild_name, old_members, new_members):
-        total = 0
-        update_dict = {}
-        for member in new_members.keys():
-            old_xp = old_members.get(member, {}).get('contributed', 0)
-            new_xp = new_members[member].get('contributed') or old_xp
-            gained = new_xp - old_xp
-            update_dict[member] = gained
-            total += gained
-
+        # Record this update, and let the policy decide when the next one is
+        now = dt.now().timestamp()
+        schedule = dict(self.schedules.get(guild_name) or {})
+        if last_update := schedule.get('last_update'):
+            elapsed = now - last_update
+        else:
+            # The first update we know of, so we assume the daily updates guilds used to get
+            elapsed = DAY
+        online = sum(1 for member in memberdict.values() if member['name'] in self.bot.players.snapshot)
+
+        interval = self.policy.next_interval(guild_name, schedule,
+                                             Observation(elapsed, diff.num_changes, diff.changed, online))
+        schedule.update(last_update=now, next_update=now + interval)
+        self.schedules[guild_name] = schedule
+        await self.bot.writes.set(self.schedule_path().child(guild_name), schedule)
+
+        self.updated += 1
+        return schedule['next_update']
+
+    async def update_xp(self, guild_name, gained: dict[str, int]):
+        """Records the XP each member gained since the last update, members who gained none are left out"""
+        total = sum(gained.values())
         timestamp = int(dt.now().timestamp())
 
-        self.xp_path().child('contributed').child(guild_name).child(timestamp).update(update_dict)
-        self.xp_path().child('guilds').child(guild_name).child(timestamp).set(total)
+        if gained:
+            contributed_path = self.xp_path().child('contributed').child(guild_name).child(timestamp)
+            await self.bot.writes.update(contributed_path, gained)
+        await self.bot.writes.set(self.xp_path().child('guilds').child(guild_name).child(timestamp), total)
+
+        # Add the gains to the rolling windows, which index them by hour so they can be expired later.
+        # Straight away and under the lock, so that an expiry can't run between adding and writing.
+        amounts = {f'guilds/{guild_name}': total}
+        amounts.update({f'contributed/{guild_name}/{uuid}': xp for uuid, xp in gained.items()})
+        async with self.bot.xp.windows.lock:
+            update_dict = {}
+            self.bot.xp.windows.add(update_dict, bucket_of(timestamp), amounts)
+            await self.xp_path().update(update_dict)
+
+    def report(self):
+        @aiocron.crontab("*/10 * * * *", start=False, tz=utc)
+        async def wrapper():
+            self.bot.logger.info(f"Guild updates: {self.updated} updated, {self.failed} failed, "
+                                 f"{self.queue_depth()} due, {self.lag():.0f}s behind"
+                                 f"{' (bursting)' if self.bursting else ''}.")
+
+        return wrapper
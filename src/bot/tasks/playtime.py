@@ -1,73 +1,318 @@
+import asyncio
+from collections import Counter
 from datetime import datetime as dt
 from datetime import timedelta as td
-from typing import List
+from typing import List, Optional
 
 import aiocron
+from aiohttp import ClientError
 from pytz import utc
-from requests import ConnectionError
 
 from ..bot import EYESBot, BotTask
+from ..managers.players import PlayerDiff
+from ..utils.playtime import PlaytimeAccumulator, SessionTracker
+from ..utils.playtime import hourly_from_sessions, prefix_sums, rollup_running_totals
+from ..utils.timeseries import DAY, bucket_of
 
 
 class PlayerPlaytimeUpdater(BotTask):
-    """Updates players' playtime for a short timeframe as raw dicts in database"""
+    """
+    Accumulates players' playtime in memory, and hands it to the grouper once per hourly bucket.
+    Consecutive polls are also tracked as sessions, which are written along with the last seen index as they end.
+    A checkpoint is saved every few polls, and after every hand-off, so that a restart
+    neither loses the current hour nor hands a bucket over twice.
+    """
+    CHECKPOINT_POLLS = 10
+
     def __init__(self, bot: EYESBot):
         super().__init__(bot)
 
-    def path(self):
-        self.bot.db.path = None
+        self.accumulator = PlaytimeAccumulator(bucket_of(dt.utcnow().timestamp()))
+        self.finished: List[PlaytimeAccumulator] = []
+        self.sessions = SessionTracker()
+        self.polls = 0
+        self.restored = asyncio.create_task(self.restore())
+
+        self.bot.players.subscribe(self.update)
+
+    def rawpath(self):
         return self.bot.db.child('wynncraft').child('playtimeraw')
 
-    def update(self, players: List[str]):
-        now = int(dt.utcnow().timestamp())
-        update_dict = {f'{k}/{now}/': True for k in players}
+    def playtime_path(self):
+        return self.bot.db.child('wynncraft').child('playtime')
+
+    def checkpoint_path(self):
+        return self.bot.db.child('wynncraft').child('playtimecheckpoint')
+
+    async def restore(self):
+        """Picks up the checkpoint (and any raw data from before accumulating) left by the last run"""
         try:
-            self.path().update(update_dict)
-        except ConnectionError as e:
+            checkpoint = await self.checkpoint_path().get() or {}
+            finished = checkpoint.get('finished') or {}
+            previous = [PlaytimeAccumulator.from_checkpoint(data) for data in finished.values()]
+            if 'playtime' in checkpoint:
+                previous.append(PlaytimeAccumulator.from_checkpoint(checkpoint['playtime']))
+
+            # Raw polls are counted by bucket, and handed to the grouper like the rest
+            raw = await self.rawpath().get() or {}
+            polls = Counter((name, bucket_of(int(ts))) for name, times in raw.items() for ts in times)
+            for (name, bucket), count in polls.items():
+                accumulator = PlaytimeAccumulator(bucket)
+                accumulator.add([name], count)
+                previous.append(accumulator)
+
+            by_bucket: dict[int, PlaytimeAccumulator] = {}
+            for accumulator in previous:
+                if accumulator.bucket == self.accumulator.bucket:
+                    self.accumulator.merge(accumulator)
+                elif accumulator.bucket in by_bucket:
+                    by_bucket[accumulator.bucket].merge(accumulator)
+                else:
+                    by_bucket[accumulator.bucket] = accumulator
+            self.finished = [by_bucket[b] for b in sorted(by_bucket)]
+            if 'sessions' in checkpoint:
+                self.sessions = SessionTracker.from_checkpoint(checkpoint['sessions'])
+
+            if raw:
+                # Into the checkpoint first, so that the raw polls are never lost nor counted twice
+                await self.checkpoint()
+                await self.rawpath().remove()
+        except ClientError as e:
+            self.bot.logger.error(f"Connection Error while restoring playtime: {e}")
+
+    async def flush(self):
+        """Hands every finished bucket to the grouper, keeping any it can't take yet for the next poll"""
+        grouper = self.bot.tasks.get('PlayerPlaytimeGrouper')
+        while self.finished and grouper and grouper.ready:
+            accumulator = self.finished[0]
+            await grouper.ingest(accumulator.bucket, accumulator.minutes())
+            self.finished.pop(0)
+            # Straight away, so that a restart can't find the bucket in the checkpoint again
+            await self.checkpoint()
+
+    async def update(self, diff: PlayerDiff):
+        await self.restored
+
+        now = diff.timestamp
+        bucket = bucket_of(now)
+
+        # The hour is over, so we start counting the next one
+        if bucket != self.accumulator.bucket:
+            self.finished.append(self.accumulator)
+            self.accumulator = PlaytimeAccumulator(bucket)
+
+        self.accumulator.add(diff.online)
+        self.polls += 1
+
+        # Closed sessions are stored, and give us when each player was last seen
+        if closed := self.sessions.poll(now, diff.online, diff.joined, diff.left):
+            update_dict = {f'sessions/{k}/{s}': e for k, s, e in closed}
+            update_dict.update({f'lastseen/{k}': e for k, _, e in closed})
+            await self.bot.writes.update(self.playtime_path(), update_dict)
+
+        try:
+            await self.flush()
+
+            if self.polls % self.CHECKPOINT_POLLS == 0:
+                await self.checkpoint()
+        except ClientError as e:
             self.bot.logger.error(f"Connection Error while updating: {e}")
 
+    async def checkpoint(self):
+        await self.checkpoint_path().set({
+            'playtime': self.accumulator.to_checkpoint(),
+            'finished': {str(a.bucket): a.to_checkpoint() for a in self.finished},
+            'sessions': self.sessions.to_checkpoint()
+        })
+
+    async def close(self):
+        self.bot.players.unsubscribe(self.update)
+        await self.flush()
+        await self.checkpoint()
+
 
 class PlayerPlaytimeGrouper(BotTask):
     """
-    Groups players' playtime into larger blocks:
-      -  1d for older than 30d
-      -  1h otherwise
+    Keeps per-player running totals (prefix sums) and rolling window totals of the hourly playtime,
+    so that playtime queries don't have to sum history. Playtime itself is stored as sessions,
+    and hourly blocks from before them are migrated into sessions once.
+    The windows roll by the hour, and are expired at the start of each one.
+    Running totals are kept by the hour for 30 days, and by the day after that.
+    The last bucket ingested is stored with it, and a bucket at or before it is skipped,
+    as it would be counted twice.
     """
+    BATCH_SIZE = 50
+    KEEP_HOURLY = td(days=30)
 
     def __init__(self, bot: EYESBot):
         super().__init__(bot)
 
-        self.update_short().start()
+        self.running = False
+        self.ready = False
+        self.totals: dict[str, float] = {}
+        self.ingested: Optional[int] = None
+        self.windows = bot.playtime.windows
+
+        asyncio.create_task(self.prepare())
         self.update_long().start()
+        self.update_windows().start()
 
-    def rawpath(self):
-        self.bot.db.path = None
-        return self.bot.db.child('wynncraft').child('playtimeraw')
+    def playtime_path(self):
+        return self.bot.db.child('wynncraft').child('playtime')
 
     def path(self):
-        self.bot.db.path = None
-        return self.bot.db.child('wynncraft').child('playtime').child('players')
+        return self.playtime_path().child('cumulative')
 
-    # Short: Update every 1h
-    def update_short(self):
-        """Processes raw playtime data to usable playtime data with 1h granularity."""
+    def sessions_path(self):
+        return self.playtime_path().child('sessions')
 
-        @aiocron.crontab("0 * * * *", start=False, tz=utc)
-        async def wrapper():
-            data = self.rawpath().get().val() or {}
-            one_hour_ago = int((dt.utcnow() - td(hours=1)).timestamp())
+    def checkpoint_path(self):
+        return self.bot.db.child('wynncraft').child('playtime').child('rollup')
+
+    async def prepare(self):
+        """Migrates hourly blocks into sessions, seeds the running and window totals if needed, and loads them"""
+        try:
+            await self.bot.playtime.migrate(self.BATCH_SIZE)
+            state = await self.playtime_path().child('prefixstate').get() or {}
+            await self.windows.load()
+            if not state.get('seeded'):
+                await self.seed(state)
+            self.totals = await self.playtime_path().child('total').get() or {}
+            self.ingested = await self.playtime_path().child('ingested').get()
+            await self.windows.expire(dt.utcnow().timestamp())
+        except ClientError as e:
+            self.bot.logger.error(f"Connection Error while preparing playtime totals: {e}")
+            return
 
-            # Each entry is 0.5 minutes
-            update_dict = {f'{k}/{one_hour_ago}/': 0.5 * len(v) for k, v in data.items()}
-            self.path().update(update_dict)
-            self.rawpath().remove()
+        self.ready = True
 
-        return wrapper
+    async def seed(self, state: dict):
+        """Computes running and window totals from the stored sessions, resumably, in batches"""
+        # The hour the totals are seeded as of, as later hours are ingested
+        now = state.get('bucket') or bucket_of(dt.utcnow().timestamp())
+        last_player = state.get('last_player')
+
+        players = sorted(await self.sessions_path().shallow())
+        if last_player is not None:
+            players = [p for p in players if p > last_player]
+        self.bot.logger.info(f"Seeding playtime totals for {len(players)} players.")
+
+        async def fetch(player):
+            sessions = await self.sessions_path().child(player).order_by_key().end_at(str(now - 1)).get()
+            return player, hourly_from_sessions({int(s): e for s, e in sessions.items()}, now)
+
+        for i in range(0, len(players), self.BATCH_SIZE):
+            batch = players[i:i + self.BATCH_SIZE]
+            update_dict = {}
+            for player, hours in await asyncio.gather(*map(fetch, batch)):
+                if not hours:
+                    continue
+                sums, total = prefix_sums({str(k): v for k, v in hours.items()})
+                update_dict[f'cumulative/{player}'] = sums
+                update_dict[f'total/{player}'] = total
+                update_dict.update(self.windows.totals(player, hours, now))
+
+            update_dict['prefixstate'] = {'seeded': False, 'bucket': now, 'last_player': batch[-1]}
+            await self.playtime_path().update(update_dict)
+
+        await self.windows.start(now, {'prefixstate': {'seeded': True, 'bucket': now}})
+
+    async def ingest(self, bucket: int, minutes: dict[str, float]):
+        """Records one hourly bucket of playtime, updating running and window totals with it"""
+        if self.ingested is not None and bucket <= self.ingested:
+            self.bot.logger.info(f"Skipping playtime bucket {bucket}, which was already ingested.")
+            return
+
+        # A bucket ingested late is only added to the windows that still cover it
+        await self.windows.expire(dt.utcnow().timestamp())
+        async with self.windows.lock:
+            totals = {}
+            update_dict = {}
+            for player, m in minutes.items():
+                totals[player] = total = self.totals.get(player, 0) + m
+                update_dict[f'cumulative/{player}/{bucket}'] = total
+                update_dict[f'total/{player}'] = total
+            self.windows.add(update_dict, bucket, minutes)
+
+            update_dict['ingested'] = bucket
+            await self.playtime_path().update(update_dict)
+        self.totals.update(totals)
+        self.ingested = bucket
+
+    async def rollup(self):
+        """
+        Compacts running totals older than 30 days to one per day, the last one of that day.
+        A running total query within such a day is then answered to the day rather than to the hour.
+
+        Players are processed in sorted batches, and the last finished player is
+        checkpointed, so an interrupted run resumes where it left off. Each batch is
+        a single multi-path update and re-rolling a day changes nothing, so a batch
+        that is repeated is harmless.
+        """
+        checkpoint = await self.checkpoint_path().get() or {}
+
+        # Resume an unfinished run with its original cutoff, otherwise start a new one
+        if checkpoint.get('last_player') is not None:
+            cutoff = checkpoint['cutoff']
+        else:
+            cutoff = bucket_of(dt.utcnow().timestamp() - self.KEEP_HOURLY.total_seconds(), DAY)
+        # Data before the last completed cutoff is already rolled up
+        since = checkpoint.get('done')
+        last_player = checkpoint.get('last_player')
+
+        players = sorted(await self.path().shallow())
+        if last_player is not None:
+            players = [p for p in players if p > last_player]
+
+        async def fetch(player):
+            query = self.path().child(player).order_by_key().end_at(str(cutoff - 1))
+            if since is not None:
+                query = query.start_at(str(since))
+            return player, await query.get()
+
+        removed = 0
+        for i in range(0, len(players), self.BATCH_SIZE):
+            batch = players[i:i + self.BATCH_SIZE]
+            update_dict = {}
+            for player, sums in await asyncio.gather(*map(fetch, batch)):
+                changes, count = rollup_running_totals(sums)
+                update_dict.update({f'{player}/{k}': v for k, v in changes.items()})
+                removed += count
+
+            if update_dict:
+                await self.path().update(update_dict)
+            await self.checkpoint_path().set({'cutoff': cutoff, 'done': since, 'last_player': batch[-1]})
+
+        await self.checkpoint_path().set({'cutoff': cutoff, 'done': cutoff, 'last_player': None})
+        self.bot.logger.info(f"Playtime rollup: removed {removed} keys from {len(players)} players.")
 
     # Long: Update every 1d
     def update_long(self):
         @aiocron.crontab("0 0 * * *", start=False, tz=utc)
         async def wrapper():
-            pass
+            if self.running:
+                return
+
+            self.running = True
+            try:
+                await self.rollup()
+            except ClientError as e:
+                self.bot.logger.error(f"Connection Error during playtime rollup: {e}")
+            finally:
+                self.running = False
+
+        return wrapper
+
+    # Hourly, as the windows roll by the hour
+    def update_windows(self):
+        @aiocron.crontab("0 * * * *", start=False, tz=utc)
+        async def wrapper():
+            if not self.ready:
+                return
+
+            try:
+                await self.windows.expire(dt.utcnow().timestamp())
+            except ClientError as e:
+                self.bot.logger.error(f"Connection Error while expiring playtime windows: {e}")
 
         return wrapper
@@ -0,0 +1,198 @@
+import asyncio
+from datetime import datetime as dt
+
+import aiocron
+from aiohttp import ClientError
+from pytz import utc
+
+from ..bot import EYESBot, BotTask
+from ..utils.timeseries import BUCKET, DAY, WINDOWS, bucket_of, increment
+from ..utils.xp import TIERS, rollup_members, rollup_totals, tier_bucket
+
+
+class GuildXPRollup(BotTask):
+    """
+    Downsamples guild XP once a day: raw points into hourly buckets, hourly into daily and
+    daily into weekly, once they are older than their tier keeps them.
+
+    Guilds are processed in sorted batches, each a single multi-path update that moves
+    points into the next tier by removing them and incrementing their buckets. That
+    makes each batch atomic, and the last finished guild is checkpointed so an
+    interrupted run resumes where it left off.
+
+    It also fills the rolling XP windows GuildUpdater adds to from the XP history once,
+    and expires the hours that fall out of them.
+    """
+    BATCH_SIZE = 50
+
+    def __init__(self, bot: EYESBot):
+        super().__init__(bot)
+
+        self.running = False
+        self.windows = bot.xp.windows
+        asyncio.create_task(self.prepare())
+        self.update().start()
+        self.update_windows().start()
+
+    def path(self):
+        return self.bot.db.child('wynncraft').child('xp')
+
+    def checkpoint_path(self):
+        return self.path().child('rollup')
+
+    async def prepare(self):
+        """Seeds the windows from the XP history if they haven't been, then expires the hours missed while down"""
+        try:
+            if await self.windows.load() is None:
+                await self.seed(await self.path().child('windowseed').get() or {})
+            await self.windows.expire(dt.utcnow().timestamp())
+        except ClientError as e:
+            self.bot.logger.error(f"Connection Error while preparing XP windows: {e}")
+
+    async def seed(self, state: dict):
+        """Computes the windows of every guild and member from the XP history, resumably, in batches"""
+        # The hour the windows are seeded as of, as GuildUpdater adds the later hours
+        now = state.get('bucket') or bucket_of(dt.utcnow().timestamp())
+        last_guild = state.get('last_guild')
+
+        tiers = [self.bot.xp.tier_path(tier).child('guilds') for tier in TIERS]
+        guilds = sorted(set().union(*await asyncio.gather(*(path.shallow() for path in tiers))))
+        if last_guild is not None:
+            guilds = [g for g in guilds if g > last_guild]
+        self.bot.logger.info(f"Seeding the XP windows for {len(guilds)} guilds.")
+
+        start = now - max(WINDOWS) * DAY
+
+        async def fetch(guild):
+            totals, buckets = await asyncio.gather(self.bot.xp.series(guild, start, now - 1, BUCKET),
+                                                   self.bot.xp.member_series(guild, start, now - 1, BUCKET))
+            return guild, totals, buckets
+
+        for i in range(0, len(guilds), self.BATCH_SIZE):
+            batch = guilds[i:i + self.BATCH_SIZE]
+            update_dict = {}
+            for guild, totals, buckets in await asyncio.gather(*map(fetch, batch)):
+                members = {}
+                for b, bucket in buckets.items():
+                    for uuid, xp in bucket.items():
+                        members.setdefault(uuid, {})[b] = xp
+
+                windows = self.windows.totals(f'guilds/{guild}', totals, now)
+                for uuid, amounts in members.items():
+                    windows.update(self.windows.totals(f'contributed/{guild}/{uuid}', amounts, now))
+                # As increments, since GuildUpdater is already adding the gains from this hour on
+                update_dict.update({k: increment(v) for k, v in windows.items() if v})
+
+            update_dict['windowseed'] = {'bucket': now, 'last_guild': batch[-1]}
+            await self.path().update(update_dict)
+
+        await self.windows.start(now, {'windowseed': None})
+
+    @staticmethod
+    def prefix(tier) -> str:
+        return '' if tier.size == 0 else f'{tier.name}/'
+
+    def cutoffs(self, now: int) -> list[tuple[int, int]]:
+        """(tier, cutoff) for every tier that gives up points, aligned so that no bucket is left partly rolled"""
+        cutoffs = []
+        for i, tier in enumerate(TIERS):
+            if tier.keep is None:
+                continue
+            size = TIERS[i + 1].size if i + 1 < len(TIERS) else tier.size
+            cutoffs.append((i, tier_bucket(now - tier.keep, size)))
+        return cutoffs
+
+    async def roll(self, guild: str, cutoffs: list[tuple[int, int]]) -> dict:
+        """The changes that move a guild's old points into the next tier, or drop them from the last one"""
+        async def read(tier, kind, cutoff):
+            path = self.path().child(self.prefix(tier) + kind).child(guild)
+            return await path.order_by_key().end_at(str(cutoff - 1)).get()
+
+        def add(key: str, v: float, member: str = None):
+            if key not in update_dict:
+                update_dict[f'{key}/{member}' if member else key] = increment(v)
+            # When catching up, a bucket can be rolled up by this very update, so it starts again from nothing
+            elif member is None:
+                update_dict[key] = (update_dict[key] or 0) + v
+            else:
+                bucket = update_dict[key] = update_dict[key] or {}
+                bucket[member] = bucket.get(member, 0) + v
+
+        update_dict = {}
+        # Coarsest first, so removals are known before finer tiers add to the same buckets
+        for i, cutoff in reversed(cutoffs):
+            tier = TIERS[i]
+            target = TIERS[i + 1] if i + 1 < len(TIERS) else None
+            totals, members = await asyncio.gather(read(tier, 'guilds', cutoff), read(tier, 'contributed', cutoff))
+
+            for kind, data in (('guilds', totals), ('contributed', members)):
+                update_dict.update({f'{self.prefix(tier)}{kind}/{guild}/{k}': None for k in data})
+            if target is None:
+                continue
+
+            for b, v in rollup_totals(totals, target.size).items():
+                add(f'{self.prefix(target)}guilds/{guild}/{b}', v)
+            for b, bucket in rollup_members(members, target.size).items():
+                for uuid, v in bucket.items():
+                    add(f'{self.prefix(target)}contributed/{guild}/{b}', v, uuid)
+
+        return update_dict
+
+    async def rollup(self):
+        checkpoint = await self.checkpoint_path().get() or {}
+
+        # Resume an unfinished run with its original time, otherwise start a new one
+        if checkpoint.get('last_guild') is not None:
+            now = checkpoint['now']
+        else:
+            now = int(dt.utcnow().timestamp())
+        last_guild = checkpoint.get('last_guild')
+        cutoffs = self.cutoffs(now)
+
+        # Guilds may only have points left in older tiers
+        tiers = [self.path().child(self.prefix(TIERS[i]) + 'guilds') for i, _ in cutoffs]
+        guilds = sorted(set().union(*await asyncio.gather(*(path.shallow() for path in tiers))))
+        if last_guild is not None:
+            guilds = [g for g in guilds if g > last_guild]
+
+        changed = 0
+        for i in range(0, len(guilds), self.BATCH_SIZE):
+            batch = guilds[i:i + self.BATCH_SIZE]
+            update_dict = {}
+            for changes in await asyncio.gather(*(self.roll(guild, cutoffs) for guild in batch)):
+                update_dict.update(changes)
+
+            if update_dict:
+                await self.path().update(update_dict)
+                changed += len(update_dict)
+            await self.checkpoint_path().set({'now': now, 'last_guild': batch[-1]})
+
+        await self.checkpoint_path().set({'now': now, 'last_guild': None})
+        self.bot.logger.info(f"XP rollup: {changed} changes over {len(guilds)} guilds.")
+
+    def update(self):
+        @aiocron.crontab("30 0 * * *", start=False, tz=utc)
+        async def wrapper():
+            if self.running:
+                return
+
+            self.running = True
+            try:
+                await self.rollup()
+            except ClientError as e:
+                self.bot.logger.error(f"Connection Error during XP rollup: {e}")
+            finally:
+                self.running = False
+
+        return wrapper
+
+    # Hourly, like the playtime windows
+    def update_windows(self):
+        @aiocron.crontab("0 * * * *", start=False, tz=utc)
+        async def wrapper():
+            try:
+                await self.windows.expire(dt.utcnow().timestamp())
+            except ClientError as e:
+                self.bot.logger.error(f"Connection Error while expiring XP windows: {e}")
+
+        return wrapper
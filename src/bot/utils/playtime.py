@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import base64
+import sys
+from array import array
+from collections import deque
+from typing import Collection, Iterable
+
+from .timeseries import BUCKET, DAY, bucket_of
+
+POLL_MINUTES = 0.5
+
+
+class PlaytimeAccumulator:
+    """
+    Counts how many polls each player was online for during one hourly bucket.
+
+    Names are interned and mapped to an index into a compact array of counters,
+    so a poll of the whole online population costs one dict lookup per player.
+    """
+
+    def __init__(self, bucket: int):
+        self.bucket = bucket
+        self.index: dict[str, int] = {}
+        self.names: list[str] = []
+        self.counts = array('H')
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, players: Iterable[str], count: int = 1):
+        index, counts = self.index, self.counts
+        for name in players:
+            i = index.get(name)
+            if i is None:
+                i = index[sys.intern(name)] = len(self.names)
+                self.names.append(name)
+                counts.append(0)
+            counts[i] += count
+
+    def merge(self, other: PlaytimeAccumulator):
+        for name, count in zip(other.names, other.counts):
+            self.add([name], count)
+
+    def minutes(self) -> dict[str, float]:
+        return {name: POLL_MINUTES * count for name, count in zip(self.names, self.counts)}
+
+    def to_checkpoint(self) -> dict:
+        """A compact form for the database: names joined by newlines and the raw counter array"""
+        return {
+            'bucket': self.bucket,
+            'names': '\n'.join(self.names),
+            'counts': base64.b64encode(self.counts.tobytes()).decode('ascii')
+        }
+
+    @classmethod
+    def from_checkpoint(cls, data: dict) -> PlaytimeAccumulator:
+        self = cls(data['bucket'])
+        self.names = data['names'].split('\n') if data['names'] else []
+        self.index = {sys.intern(name): i for i, name in enumerate(self.names)}
+        self.counts.frombytes(base64.b64decode(data['counts']))
+        return self
+
+
+def rollup_running_totals(sums: dict[str, float]) -> tuple[dict[str, None], int]:
+    """
+    Keeps only the last running total (timestamp -> total) of each day, which is the total at the end of that day.
+    Returns the changes to apply (None removes a key) and how many keys are removed.
+    """
+    last: dict[int, str] = {}
+    for k in sorted(sums, key=int):
+        last[bucket_of(int(k), DAY)] = k
+
+    kept = set(last.values())
+    changes = {k: None for k in sums if k not in kept}
+    return changes, len(changes)
+
+
+def prefix_sums(hours: dict[str, float]) -> tuple[dict[str, float], float]:
+    """Turns playtime buckets into running totals at each bucket, along with the overall total"""
+    total, sums = 0, {}
+    for k in sorted(hours, key=int):
+        total += hours[k]
+        sums[k] = total
+    return sums, total
+
+
+POLL_SECONDS = 30
+# Sessions are split at this length, so range queries only need to look back this far
+MAX_SESSION = 86400
+
+
+def session_overlap(sessions: dict[int, int], start: int, end: int) -> int:
+    """Total seconds of the given sessions that lie within [start, end]"""
+    return sum(max(0, min(e, end) - max(s, start)) for s, e in sessions.items())
+
+
+def sessions_from_hourly(hours: dict[str, float]) -> dict[int, int]:
+    """
+    Converts hourly playtime buckets (timestamp -> minutes) into sessions (start -> end).
+
+    A partial hour is placed against whichever neighbouring hour it touches, so that
+    consecutive hours merge into one session. The total playtime is preserved exactly.
+    """
+    totals: dict[int, float] = {}
+    for k, v in hours.items():
+        if v:
+            totals[bucket_of(int(k))] = totals.get(bucket_of(int(k)), 0) + v
+
+    sessions = {}
+    last_start = last_end = None
+    for ts in sorted(totals):
+        length = int(totals[ts] * 60)
+        if ts + BUCKET in totals and length < BUCKET:
+            start = ts + BUCKET - length
+        else:
+            start = ts
+
+        # Over an hour in one bucket runs into the next, so this one starts where that ended
+        if last_end is not None and start < last_end:
+            start = last_end
+
+        if last_end == start and start - last_start + length <= MAX_SESSION:
+            sessions[last_start] = last_end = start + length
+        else:
+            last_start, last_end = start, start + length
+            sessions[last_start] = last_end
+
+    return sessions
+
+
+def hourly_from_sessions(sessions: dict[int, int], before: int) -> dict[int, float]:
+    """Splits sessions (start -> end) into playtime per hourly bucket, for the buckets before a timestamp"""
+    hours: dict[int, float] = {}
+    for start, end in sessions.items():
+        for bucket in range(bucket_of(start), min(end, before), BUCKET):
+            if bucket + BUCKET <= before:
+                seconds = min(end, bucket + BUCKET) - max(start, bucket)
+                hours[bucket] = hours.get(bucket, 0) + seconds / 60
+    return hours
+
+
+class SessionTracker:
+    """
+    Turns consecutive polls of the online players into contiguous sessions.
+
+    Given who joined and left since the last poll, the work done is proportional to
+    the churn rather than to the online population. A full reconciliation against
+    the online players is only needed on the first poll, or after missed polls.
+    """
+
+    def __init__(self):
+        self.open: dict[str, int] = {}
+        self.last_poll: int | None = None
+        self.synced = False
+
+        # (start, name) of open sessions in order of start, for finding sessions to split
+        self._order: deque[tuple[int, str]] = deque()
+
+    def poll(self, now: int, online: Collection[str],
+             joined: Iterable[str] = None, left: Iterable[str] = None) -> list[tuple[str, int, int]]:
+        """Records a poll, and returns the (name, start, end) of every session that was closed"""
+        closed = []
+
+        # If we missed polls we can't tell who stayed online, so everyone's session ends
+        missed = self.last_poll is not None and now - self.last_poll > 2 * POLL_SECONDS
+        if missed:
+            left = list(self.open)
+        elif not self.synced or joined is None or left is None:
+            left = [name for name in self.open if name not in online]
+
+        end = self.last_poll + POLL_SECONDS if self.last_poll is not None else now
+        closed.extend((name, self.open.pop(name), end) for name in left if name in self.open)
+
+        if missed or not self.synced or joined is None:
+            joined = [name for name in online if name not in self.open]
+
+        for name in joined:
+            if name not in self.open:
+                self.open[name] = now
+                self._order.append((now, name))
+
+        # Split sessions that reached the maximum length, skipping entries for sessions that already ended
+        while self._order and now - self._order[0][0] >= MAX_SESSION:
+            start, name = self._order.popleft()
+            if self.open.get(name) == start:
+                closed.append((name, start, now))
+                self.open[name] = now
+                self._order.append((now, name))
+
+        self.last_poll = now
+        self.synced = True
+        return closed
+
+    def to_checkpoint(self) -> dict:
+        return {
+            'last_poll': self.last_poll or 0,
+            'names': '\n'.join(self.open),
+            'starts': base64.b64encode(array('q', self.open.values()).tobytes()).decode('ascii')
+        }
+
+    @classmethod
+    def from_checkpoint(cls, data: dict) -> SessionTracker:
+        self = cls()
+        starts = array('q')
+        starts.frombytes(base64.b64decode(data['starts']))
+        names = data['names'].split('\n') if data['names'] else []
+        self.open = dict(zip(map(sys.intern, names), starts))
+        self._order = deque(sorted((start, name) for name, start in self.open.items()))
+        self.last_poll = data['last_poll'] or None
+        return self
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import math
+from datetime import timedelta as td
+from typing import NamedTuple, Optional
+
+from .timeseries import DAY
+
+
+class Observation(NamedTuple):
+    """What one guild update saw"""
+    # Seconds since the previous update
+    elapsed: float
+    # Members who joined or left
+    num_changes: int
+    # Members whose stored data changed at all, including joins, leaves and XP gains
+    changed: int
+    # Members who are online right now
+    online: int = 0
+
+
+class StepPolicy:
+    """
+    The original hand-tuned policy: the interval doubles after a few days without members
+    joining or leaving, and drops back to a day (or halves) once they do, within 6h - 8d.
+    """
+    MIN_INTERVAL = td(hours=6).total_seconds()
+    MAX_INTERVAL = td(days=8).total_seconds()
+
+    def load(self, schedules: dict[str, dict]):
+        pass
+
+    def remove(self, guild: str):
+        pass
+
+    def next_interval(self, guild: str, schedule: dict, observation: Observation) -> float:
+        """Updates a guild's schedule with what its update saw, and returns the seconds until the next one"""
+        interval = schedule.get('interval') or DAY
+        num_changes = observation.num_changes
+
+        if num_changes == 0:
+            no_diff_days = (schedule.get('no_diff_days') or 0) + interval / DAY
+        else:
+            no_diff_days = 0
+
+        # If diff = 0 for more than 5 days, increase interval
+        if num_changes == 0:
+            if interval < DAY and no_diff_days >= 2:
+                interval = DAY
+            elif no_diff_days >= 4:
+                interval *= 2
+        elif num_changes != 0:
+            if interval > DAY:
+                interval = DAY
+            elif num_changes > 1:
+                interval /= 2
+
+        schedule['no_diff_days'] = no_diff_days
+        schedule['interval'] = max(min(interval, self.MAX_INTERVAL), self.MIN_INTERVAL)
+        return schedule['interval']
+
+
+class AdaptivePolicy:
+    """
+    Spends a fixed daily budget of updates where it keeps the stored guilds up to date for the most time.
+
+    Each guild's change rate is estimated from its update history, as the changes seen
+    over the time observed, both decayed with a half-life so the estimate follows the
+    guild as it changes. A small prior keeps guilds we know little about from being
+    starved. Online members add to a guild's rate, since that's when its members gain
+    XP and move around.
+
+    If guild i changes at rate r_i and is updated every t_i, it is out of date for a fraction
+    1 - (1 - e^-x) / x of the time, where x = r_i * t_i. Minimising the total under a budget of
+    B updates a day gives each guild the x solving 1 - (1 + x) e^-x = mu * r_i, with one multiplier
+    mu for all guilds, chosen so that the intervals x / r_i spend the budget. Slowly changing guilds
+    get intervals close to sqrt(2 mu / r_i), as with the sqrt(r_i) rule that minimises unseen changes.
+
+    Guilds changing so fast that they'd be stale again right after any update would be left
+    for the longest interval, missing most of the changes there are. So no guild waits longer
+    than it takes to miss about `max_missed` changes, which costs a little staleness.
+
+    mu is found by bisection over a histogram of the rates, binned logarithmically, and found
+    again after every tenth of the guilds were updated, as their rates move.
+    """
+    # Histogram bins per factor of e in the rates
+    BINS = 20
+
+    def __init__(self, budget: float, *,
+                 min_interval: float = td(hours=1).total_seconds(),
+                 max_interval: float = td(days=8).total_seconds(),
+                 half_life: float = td(days=14).total_seconds(),
+                 prior_changes: float = 0.5, prior_time: float = DAY,
+                 online_boost: float = 0.25, max_missed: float = 10):
+        self.budget = budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.half_life = half_life
+        self.prior_changes = prior_changes
+        self.prior_time = prior_time
+        self.online_boost = online_boost
+        self.max_missed = max_missed
+
+        # guild -> its bin of rates, and how many guilds each bin holds
+        self.bins: dict[str, int] = {}
+        self.counts: dict[int, int] = {}
+        self.mu: Optional[float] = None
+        self.since_solved = 0
+
+    def rate(self, schedule: dict) -> float:
+        """Estimated changes per second"""
+        return (schedule.get('changes', 0) + self.prior_changes) / (schedule.get('observed', 0) + self.prior_time)
+
+    @staticmethod
+    def freshness_x(y: float) -> float:
+        """The x solving 1 - (1 + x) e^-x = y, for 0 < y < 1, by Newton's method"""
+        x = max(math.sqrt(2 * y), -math.log(1 - y))
+        for _ in range(4):
+            x = max(x - (1 - (1 + x) * math.exp(-x) - y) / (x * math.exp(-x)), 1e-9)
+        return x
+
+    def interval(self, rate: float, mu: float) -> float:
+        """The interval of a guild changing at a rate, for a multiplier"""
+        y = mu * rate
+        interval = self.freshness_x(y) / rate if y < 1 else self.max_interval
+        return max(min(interval, self.max_missed / rate, self.max_interval), self.min_interval)
+
+    def _set_bin(self, guild: str, rate: float):
+        self.remove(guild)
+        b = self.bins[guild] = round(math.log(rate) * self.BINS)
+        self.counts[b] = self.counts.get(b, 0) + 1
+
+    def solve(self):
+        """Finds the multiplier whose intervals spend the budget, by bisection in log space"""
+        rates = {b: math.exp(b / self.BINS) for b in self.counts}
+
+        def overspent(log_mu):
+            mu = math.exp(log_mu)
+            return sum(count * DAY / self.interval(rates[b], mu) for b, count in self.counts.items()) > self.budget
+
+        # Starting around the last multiplier, as it moves little between solves
+        lo = hi = math.log(self.mu) if self.mu else 0.0
+        while overspent(hi) and hi < 100:
+            hi += 2
+        while not overspent(lo) and lo > -100:
+            lo -= 2
+        for _ in range(20):
+            mid = (lo + hi) / 2
+            if overspent(mid):
+                lo = mid
+            else:
+                hi = mid
+        self.mu = math.exp(hi)
+        self.since_solved = 0
+
+    def load(self, schedules: dict[str, dict]):
+        self.bins, self.counts = {}, {}
+        for guild, schedule in schedules.items():
+            self._set_bin(guild, self.rate(schedule))
+        self.mu = None
+
+    def remove(self, guild: str):
+        if (b := self.bins.pop(guild, None)) is not None:
+            self.counts[b] -= 1
+            if not self.counts[b]:
+                del self.counts[b]
+
+    def next_interval(self, guild: str, schedule: dict, observation: Observation) -> float:
+        """Updates a guild's schedule with what its update saw, and returns the seconds until the next one"""
+        decay = 0.5 ** (observation.elapsed / self.half_life)
+        schedule['changes'] = schedule.get('changes', 0) * decay + observation.changed
+        schedule['observed'] = schedule.get('observed', 0) * decay + observation.elapsed
+
+        rate = self.rate(schedule) * (1 + self.online_boost * observation.online)
+        self._set_bin(guild, rate)
+
+        self.since_solved += 1
+        if self.mu is None or self.since_solved * 10 >= len(self.bins):
+            self.solve()
+        return self.interval(rate, self.mu)
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Awaitable, Callable, Hashable, Sequence, Union
+
+from fuzzywuzzy import fuzz
+
+from .cache import LRUCache
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+def trigrams(text: str, end: bool = True) -> set[str]:
+    """The trigrams of a normalized text, padded so that its start (and end) count too"""
+    padded = f'  {text} ' if end else f'  {text}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class GuildIndex:
+    """
+    A search index over guild names and tags, for autocompletion.
+
+    A query is looked up in three places, in order of how good a match they give:
+      - a case-folded tag map, for exact tag matches
+      - a sorted array of case-folded names and every word suffix of them, where bisect
+        finds the names (or a word in them) starting with the query
+      - a trigram index, whose best candidates are the only ones scored with fuzzywuzzy
+
+    The index is updated incrementally from the guild -> tag map, and its version
+    changes whenever the guilds in it do.
+    """
+    # How many fuzzy candidates are scored
+    SHORTLIST = 50
+    # Above this fraction of guilds changing, rebuilding is cheaper than updating
+    REBUILD_FRACTION = 0.1
+
+    def __init__(self):
+        self.g2p: dict[str, str] = {}
+        self.version = 0
+
+        self.tags: dict[str, list[str]] = {}
+        self.prefixes: list[tuple[str, str]] = []
+        self.trigrams: dict[str, set[str]] = {}
+
+    def __len__(self):
+        return len(self.g2p)
+
+    @staticmethod
+    def _suffixes(guild: str) -> list[str]:
+        words = normalize(guild).split(' ')
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _add(self, guild: str, tag: str, *, sort: bool = True):
+        self.g2p[guild] = tag
+        self.tags.setdefault(tag.casefold(), []).append(guild)
+        for suffix in self._suffixes(guild):
+            if sort:
+                insort(self.prefixes, (suffix, guild))
+            else:
+                self.prefixes.append((suffix, guild))
+        for t in trigrams(normalize(guild)):
+            self.trigrams.setdefault(t, set()).add(guild)
+
+    def _remove(self, guild: str):
+        tag = self.g2p.pop(guild)
+        guilds = self.tags[tag.casefold()]
+        guilds.remove(guild)
+        if not guilds:
+            del self.tags[tag.casefold()]
+        for suffix in self._suffixes(guild):
+            del self.prefixes[bisect_left(self.prefixes, (suffix, guild))]
+        for t in trigrams(normalize(guild)):
+            self.trigrams[t].discard(guild)
+            if not self.trigrams[t]:
+                del self.trigrams[t]
+
+    def rebuild(self, g2p: dict[str, str]):
+        self.g2p, self.tags, self.prefixes, self.trigrams = {}, {}, [], {}
+        for guild, tag in g2p.items():
+            self._add(guild, tag, sort=False)
+        self.prefixes.sort()
+        self.version += 1
+
+    def update(self, g2p: dict[str, str]):
+        """Brings the index up to date with a guild -> tag map, touching only the guilds that changed"""
+        removed = [g for g, tag in self.g2p.items() if g2p.get(g) != tag]
+        added = [g for g, tag in g2p.items() if self.g2p.get(g) != tag]
+        if not removed and not added:
+            return
+
+        if len(removed) + len(added) > self.REBUILD_FRACTION * max(len(self.g2p), 1):
+            return self.rebuild(g2p)
+
+        for guild in removed:
+            self._remove(guild)
+        for guild in added:
+            self._add(guild, g2p[guild])
+        self.version += 1
+
+    def search(self, query: str, limit: int = 25) -> list[str]:
+        if not (query := normalize(query)):
+            return []
+
+        # Used as an ordered set
+        results = dict.fromkeys(self.tags.get(query, ()))
+
+        i = bisect_left(self.prefixes, (query,))
+        while len(results) < limit and i < len(self.prefixes) and self.prefixes[i][0].startswith(query):
+            results.setdefault(self.prefixes[i][1])
+            i += 1
+
+        if len(results) < limit:
+            counts = Counter()
+            for t in trigrams(query, end=False):
+                counts.update(self.trigrams.get(t, ()))
+            shortlist = [g for g, _ in counts.most_common(self.SHORTLIST) if g not in results]
+            shortlist.sort(key=lambda g: fuzz.partial_ratio(query, g.casefold()), reverse=True)
+            results.update(dict.fromkeys(shortlist))
+
+        return list(results)[:limit]
+
+
+class AutocompleteCache:
+    """
+    Caches autocomplete results by normalized query, for as long as the data they were
+    computed from keeps the same version. Discord asks again on every keystroke, and many
+    users type the same names, so most requests are answered without searching.
+
+    Identical queries that arrive while one is being computed wait for that computation
+    instead of starting their own.
+    """
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 4096):
+        self.results = LRUCache(maxsize)
+        self.version: Hashable = None
+        # (query, version) -> the computation in flight
+        self.pending: dict[tuple, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def get(self, query: str, version: Hashable,
+                  compute: Callable[[str], Union[Sequence, Awaitable[Sequence]]]) -> tuple:
+        """The results of compute(normalized query), computed at most once per query and version"""
+        if version != self.version:
+            self.results.clear()
+            self.version = version
+
+        query = normalize(query)
+        key = (query, version)
+        results = self.results.get(key, self._MISSING)
+        if results is not self._MISSING:
+            return results
+
+        future = self.pending.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self.pending[key] = asyncio.ensure_future(self._compute(key, compute))
+        # A waiter giving up (Discord cancels stale autocompletes) mustn't cancel it for the others
+        return await asyncio.shield(future)
+
+    async def _compute(self, key: tuple, compute) -> tuple:
+        query, version = key
+        try:
+            results = compute(query)
+            if inspect.isawaitable(results):
+                results = await results
+            results = tuple(results)
+            if version == self.version:
+                self.results.set(key, results)
+            return results
+        finally:
+            del self.pending[key]
+
+    @property
+    def stats(self) -> dict:
+        return {**self.results.stats, 'coalesced': self.coalesced, 'pending': len(self.pending)}
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+from typing import Callable, Iterator, Optional
+
+if typing.TYPE_CHECKING:
+    from ..database import Reference
+
+# Time series are kept in hourly buckets, keyed by the timestamp they start at
+BUCKET = 3600
+DAY = 86400
+
+# Rolling windows (in days) that are kept up to date for players' playtime and guilds' XP
+WINDOWS = (1, 7, 14, 30)
+
+
+def bucket_of(timestamp: float, size: int = BUCKET) -> int:
+    return int(timestamp // size * size)
+
+
+def increment(amount: float) -> dict:
+    """A server value that adds to the stored number instead of replacing it"""
+    return {'.sv': {'increment': amount}}
+
+
+def _flatten(data: dict, prefix: str = '') -> Iterator[tuple[str, float]]:
+    for k, v in data.items():
+        if isinstance(v, dict):
+            yield from _flatten(v, f'{prefix}{k}/')
+        else:
+            yield f'{prefix}{k}', v
+
+
+class RollingWindows:
+    """
+    Totals over the last 1, 7, 14 and 30 days, rolling by the hour, kept under a database path.
+
+    Amounts are added to every window still covering their bucket, and to an index of that
+    bucket. Each hour, the buckets that fell out of a window are read back from the index and
+    subtracted from it, and the index is dropped once it's older than the largest window.
+
+    `state` is the hour the windows were last expired at, kept in memory so that adding and
+    expiring agree on it: the d day window covers the buckets after state - d days.
+    Keys are paths in the index, which `window_key` maps to their path in the d day window.
+    """
+
+    def __init__(self, path: Callable[[], 'Reference'], window_key: Callable[[str, int], str]):
+        self.path = path
+        self.window_key = window_key
+        self.state: Optional[int] = None
+        # Held while adding or expiring, so that neither sees the state change halfway through
+        self.lock = asyncio.Lock()
+
+    def _covers(self, bucket: int, days: int) -> bool:
+        return self.state is None or bucket > self.state - days * DAY
+
+    async def load(self) -> Optional[int]:
+        """Loads the hour the windows were last expired at, None if they were never started"""
+        self.state = await self.path().child('windowhour').get()
+        return self.state
+
+    async def start(self, state: int, update_dict: dict = None):
+        """Marks the windows as expired up to an hour, along with any other changes"""
+        await self.path().update({**(update_dict or {}), 'windowhour': state})
+        self.state = state
+
+    def add(self, update_dict: dict, bucket: int, amounts: dict[str, float]):
+        """Adds the amounts of a bucket to an update, as increments of the windows and index that cover it"""
+        for d in WINDOWS:
+            if self._covers(bucket, d):
+                update_dict.update({f'windows/{self.window_key(k, d)}': increment(v) for k, v in amounts.items()})
+        if self._covers(bucket, max(WINDOWS)):
+            update_dict.update({f'hours/{bucket}/{k}': increment(v) for k, v in amounts.items()})
+
+    def totals(self, key: str, amounts: dict[int, float], state: int) -> dict:
+        """The windows and index of one key, from its amounts by bucket, as of the hour `state`"""
+        update_dict = {f'windows/{self.window_key(key, d)}': sum(v for b, v in amounts.items() if b > state - d * DAY)
+                       for d in WINDOWS}
+        update_dict.update({f'hours/{b}/{key}': v for b, v in amounts.items() if b > state - max(WINDOWS) * DAY})
+        return update_dict
+
+    async def expire(self, now: float):
+        """Subtracts the buckets that fell out of each window since the last expiry, catching up hour by hour"""
+        async def read(bucket):
+            return dict(_flatten(await self.path().child('hours').child(bucket).get() or {}))
+
+        async with self.lock:
+            if self.state is None:
+                return
+
+            for state in range(self.state + BUCKET, bucket_of(now) + BUCKET, BUCKET):
+                update_dict = {}
+                # The d day window no longer covers the bucket d days before
+                expired = await asyncio.gather(*(read(state - d * DAY) for d in WINDOWS))
+                for d, amounts in zip(WINDOWS, expired):
+                    update_dict.update({f'windows/{self.window_key(k, d)}': increment(-v) for k, v in amounts.items()})
+
+                update_dict[f'hours/{state - max(WINDOWS) * DAY}'] = None
+                update_dict['windowhour'] = state
+                await self.path().update(update_dict)
+                self.state = state
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from calendar import timegm
 from datetime import datetime as dt
 
 from dateutil import parser as dtparser
@@ -12,9 +13,43 @@ RANKS = [
     'CHIEF',
     'OWNER'
 ]
+RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+
+
+def parse_timestamp(text: str) -> float:
+    """
+    Parses the API's UTC timestamps ('2020-01-01T12:34:56.789Z') by slicing the fixed format,
+    falling back to dateutil for anything else.
+    """
+    try:
+        if len(text) >= 20 and text[-1] == 'Z' and text[10] == 'T':
+            seconds = timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                              int(text[11:13]), int(text[14:16]), int(text[17:19])))
+            fraction = text[19:-1]
+            return seconds + (float(fraction) if fraction else 0.0)
+    except ValueError:
+        pass
+    return dtparser.parse(text).timestamp()
+
+
+def decode_member(data: dict) -> tuple[str, dict]:
+    """Turns a member from guildStats into its storage form: uuid -> { name, rank, joined, contributed }"""
+    return data['uuid'], {
+        'name': data['name'],
+        'rank': RANK_INDEX.get(data['rank'], 0),
+        'joined': parse_timestamp(data['joined']) if data['joined'] else 0,
+        'contributed': data.get('contributed') or 0
+    }
+
+
+def decode_members(members: list[dict]) -> dict[str, dict]:
+    """Decodes a guildStats members list straight into storage form, without building a GuildMember each"""
+    return dict(map(decode_member, members))
 
 
 class GuildMember:
+    __slots__ = ('uuid', 'name', 'rank', 'joined', 'contributed')
+
     def __init__(self,
                  uuid: str,
                  name: str,
@@ -25,10 +60,8 @@ class GuildMember:
         self.uuid = uuid
         self.name = name
         self.rank = rank
-        if isinstance(joined, dt):
-            self.joined = joined
-        else:
-            self.joined = dt.utcfromtimestamp(joined)
+        # Kept as a timestamp, see joined_at for the datetime
+        self.joined = joined.timestamp() if isinstance(joined, dt) else joined
         self.contributed = contributed
 
     def __repr__(self):
@@ -37,18 +70,68 @@ class GuildMember:
     def __str__(self):
         return f"<GuildMember name={self.name}>"
 
+    @property
+    def joined_at(self) -> dt:
+        return dt.utcfromtimestamp(self.joined)
+
     @classmethod
     def from_data(cls, data):
-        if data['rank']:
-            data['rank'] = RANKS.index(data['rank'])
-        if data['joined']:
-            data['joined'] = dtparser.parse(data['joined'])
-        return cls(**data)
+        uuid, member = decode_member(data)
+        return cls(uuid, **member)
 
     # uuid -> { name, rank: int, joined: float (timestamp), contributed: int }
     def to_dict_item(self):
-        k = self.uuid
-        v = vars(self)
-        del v['uuid']
-        v['joined'] = v['joined'].timestamp()
-        return k, v
+        return self.uuid, {'name': self.name, 'rank': self.rank, 'joined': self.joined, 'contributed': self.contributed}
+
+
+class MemberDiff:
+    """The changes between two stored member maps, found in one walk over them"""
+    __slots__ = ('changes', 'added', 'removed', 'changed', 'gained')
+
+    def __init__(self):
+        # Relative paths under the members node -> new value (None removes), for one multi-path update
+        self.changes: dict = {}
+        self.added = 0
+        self.removed = 0
+        # Members with any change, including those who joined or left
+        self.changed = 0
+        # uuid -> contributed xp gained, for members whose xp changed
+        self.gained: dict[str, int] = {}
+
+    @property
+    def num_changes(self) -> int:
+        """How many members joined or left"""
+        return self.added + self.removed
+
+
+def diff_members(old: dict[str, dict], new: dict[str, dict]) -> MemberDiff:
+    diff = MemberDiff()
+    changes, gained = diff.changes, diff.gained
+    for uuid, member in new.items():
+        previous = old.get(uuid)
+        if previous is None:
+            diff.added += 1
+            diff.changed += 1
+            changes[uuid] = member
+            if member['contributed']:
+                gained[uuid] = member['contributed']
+            continue
+
+        fields = len(changes)
+        for field, value in member.items():
+            if previous.get(field) != value:
+                changes[f'{uuid}/{field}'] = value
+        if len(changes) != fields:
+            diff.changed += 1
+
+        # A missing contribution means we don't know it, not that it was lost
+        old_xp = previous.get('contributed', 0)
+        if (new_xp := member['contributed'] or old_xp) != old_xp:
+            gained[uuid] = new_xp - old_xp
+
+    for uuid in old.keys() - new.keys():
+        diff.removed += 1
+        diff.changed += 1
+        changes[uuid] = None
+
+    return diff
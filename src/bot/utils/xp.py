@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import NamedTuple, Optional
+
+from .timeseries import BUCKET, DAY, bucket_of
+
+WEEK = 7 * DAY
+# Weeks start on Monday, and 1970-01-05 was the first Monday after the epoch
+WEEK_OFFSET = 4 * DAY
+
+
+class Tier(NamedTuple):
+    name: str
+    # Bucket size in seconds, 0 for raw points
+    size: int
+    # How long points stay in this tier before they are rolled into the next one, None keeps them forever.
+    # Points in the last tier are dropped once they are older than this.
+    keep: Optional[int]
+
+
+# Guild XP is recorded as raw points on every guild update, then downsampled tier by tier
+TIERS = (
+    Tier('raw', 0, 2 * DAY),
+    Tier('hourly', BUCKET, 14 * DAY),
+    Tier('daily', DAY, 180 * DAY),
+    Tier('weekly', WEEK, None)
+)
+
+
+def tier_bucket(timestamp: int, size: int) -> int:
+    if size == 0:
+        return timestamp
+    if size == WEEK:
+        return bucket_of(timestamp - WEEK_OFFSET, WEEK) + WEEK_OFFSET
+    return bucket_of(timestamp, size)
+
+
+def rollup_totals(points: dict[str, float], size: int) -> dict[int, float]:
+    """Sums points (timestamp -> xp) into buckets of the given size"""
+    buckets = {}
+    for k, v in points.items():
+        b = tier_bucket(int(k), size)
+        buckets[b] = buckets.get(b, 0) + v
+    return buckets
+
+
+def rollup_members(points: dict[str, dict[str, int]], size: int) -> dict[int, dict[str, int]]:
+    """Sums member points (timestamp -> uuid -> xp) into buckets of the given size"""
+    buckets = {}
+    for k, members in points.items():
+        bucket = buckets.setdefault(tier_bucket(int(k), size), {})
+        for uuid, v in members.items():
+            bucket[uuid] = bucket.get(uuid, 0) + v
+    return buckets